@@ -0,0 +1,35 @@
+// Follows /events and hands the new updates to the Dash callbacks.
+//
+// Dash can't be told about data from outside, so the rows are kept in
+// window.liveUpdates and the hidden 'live-updates-trigger' button is
+// clicked; its clientside callback (in src/app.py) takes them from there.
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+
+    window.liveUpdates = {rows: [], reload: false};
+
+    function notify() {
+        var trigger = document.getElementById('live-updates-trigger');
+        // the layout may not be rendered yet, the rows wait for the next event
+        if (trigger) {
+            trigger.click();
+        }
+    }
+
+    var source = new EventSource('/events');
+
+    source.addEventListener('updates', function (event) {
+        var rows = JSON.parse(event.data);
+        window.liveUpdates.rows = window.liveUpdates.rows.concat(rows);
+        notify();
+    });
+
+    source.addEventListener('reload', function () {
+        // too many updates were missed to merge them, query the table again
+        window.liveUpdates.rows = [];
+        window.liveUpdates.reload = true;
+        notify();
+    });
+})();
@@ -0,0 +1,86 @@
+'''Import-time benchmark of the entry points.
+
+Imports every module in a fresh interpreter with `-X importtime` and
+reports the cumulative import time and the heavy dependencies it loaded:
+
+    > python -m bench.imports
+    > python -m bench.imports --modules main src.app --repeat 10 --json imports.json
+
+`main` is what every scrape worker process imports again when it starts.
+'''
+import subprocess
+import statistics
+import argparse
+import json
+import sys
+
+
+DEFAULT_MODULES = ['main', 'src.app', 'src.jobs', 'src.scrape', 'src.update']
+
+# the dependencies which the web process should not need to import
+HEAVY_MODULES = ['pandas', 'selenium', 'webdriver_manager', 'lxml', 'dash']
+
+PROBE = '''
+import sys
+import {module}
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+'''
+
+
+def import_time(module):
+    '''Returns the cumulative import time (in seconds) and the heavy modules loaded.'''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}')
+
+    # the line of a module comes after the lines of the modules it imports
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        if name.strip() == module:
+            cumulative = int(cumulative_us)
+    heavy = [m for m in result.stdout.strip().split(',') if m]
+    return cumulative / 1e6, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help='the modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='the number of imports per module')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        try:
+            samples = [import_time(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        seconds = [s for s, _ in samples]
+        results.append({
+            'module': module,
+            'import': statistics.median(seconds),
+            'import_min': min(seconds),
+            'heavy': samples[0][1]
+        })
+
+    header = f'{"module":<12} {"import s":>9} {"min s":>7}  heavy modules'
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f'{r["module"]:<12} {r["import"]:>9.3f} {r["import_min"]:>7.3f}  {", ".join(r["heavy"]) or "-"}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+'''Offline benchmark of the scrapers.
+
+Serves listing pages with synthetic posts, generated from the templates in
+bench/fixtures, from a local HTTP server and times every source end to end
+and per phase:
+
+    > python -m bench.run --posts 20 200 --repeat 5
+    > python -m bench.run --engine selenium --sources pernik-vik --json results.json
+
+Every run of a source happens in a fresh process, so the reported peak RSS
+belongs to that source only. The peak of the scraping process and the peak
+of its largest child process (chromedriver and Chrome for the selenium
+engine) are reported separately. The selenium sources are skipped when no
+chromedriver is available, e.g. offline.
+'''
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import statistics
+import threading
+import argparse
+import resource
+import time
+import json
+import sys
+
+from bench.server import FixtureServer
+from src.registry import load_sources
+from src import engines
+from src import metrics
+
+
+# the phases reported per source, taken from the scraper metrics
+PHASES = {
+    'page_load': 'scrape_page_load_seconds',
+    'find': 'scrape_find_seconds',
+    'fields': 'scrape_field_seconds'
+}
+
+
+class CallCounter:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def inc(self):
+        with self._lock:
+            self.calls += 1
+
+
+def _wrap(value, counter):
+    if isinstance(value, list):
+        return [_wrap(v, counter) for v in value]
+    if hasattr(value, 'find_element_by_tag_name'):
+        return CountingProxy(value, counter)
+    return value
+
+
+class CountingProxy:
+    '''Counts the calls made to a driver and to the elements it returns.
+
+    For the selenium engine every call is a WebDriver round-trip; accessing
+    a property such as `.text` is counted as a call too.
+    '''
+    def __init__(self, target, counter):
+        self._target = target
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        counter = self._counter
+        if not callable(attribute):
+            counter.inc()
+            return attribute
+
+        def call(*args, **kwargs):
+            counter.inc()
+            return _wrap(attribute(*args, **kwargs), counter)
+        return call
+
+
+def _phase_seconds(values, metric_name, source_name):
+    return sum(
+        value[-2]
+        for (name, labels), value in values.items()
+        if name == metric_name and ('source', source_name) in labels
+    )
+
+
+def _peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on linux; for the children it is the peak
+    # of the largest one, not their sum
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def _chromedriver_available():
+    try:
+        from src.drivers import resolve_chromedriver
+        resolve_chromedriver()
+    except Exception as e:
+        print(f'Skipping the selenium sources: no chromedriver is available ({e}).', file=sys.stderr)
+        return False
+    return True
+
+
+def run_source(source_name, engine, urls):
+    '''Scrapes one source once. Runs in a separate process.'''
+    definition = next(d for d in load_sources(names=[source_name]))
+    definition.engine = engine
+    definition.definition = dict(definition.definition, urls=urls)
+    definition.urls = urls
+    source_class = definition.source_class()
+
+    counter = CallCounter()
+    start = time.perf_counter()
+    if engine == engines.HTTP:
+        session = engines.create_session()
+        driver = engines.HttpDriver(session)
+    else:
+        from src.drivers import create_chrome
+        driver = create_chrome()
+    driver_seconds = time.perf_counter() - start
+
+    try:
+        scrape_start = time.perf_counter()
+        source = source_class(CountingProxy(driver, counter))
+        scrape_seconds = time.perf_counter() - scrape_start
+    finally:
+        driver.quit()
+
+    result = {
+        'source': source_name,
+        'engine': engine,
+        'rows': len(source.updates),
+        'driver_start': driver_seconds,
+        'scrape': scrape_seconds,
+        'calls': counter.calls
+    }
+    for phase, metric_name in PHASES.items():
+        result[phase] = _phase_seconds(metrics.REGISTRY.values, metric_name, source_name)
+    result['peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_SELF)
+    result['peak_rss_children_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return result
+
+
+def _summary(results):
+    summary = dict(results[0])
+    for key in ['driver_start', 'scrape', 'page_load', 'find', 'fields', 'peak_rss_mb', 'peak_rss_children_mb']:
+        samples = [r[key] for r in results]
+        summary[key] = statistics.median(samples)
+        summary[key + '_min'] = min(samples)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', nargs='*', help='the names of the sources to benchmark (default: all)')
+    parser.add_argument('--engine', choices=[engines.HTTP, engines.SELENIUM], help='override the engine of the sources')
+    parser.add_argument('--posts', type=int, nargs='+', default=[20], help='the number of posts on every listing page')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of runs per source')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the synthetic posts')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    definitions = load_sources(names=args.sources)
+    context = multiprocessing.get_context('spawn')
+    summaries = []
+    # resolved once, at the first source which needs a browser
+    chromedriver = None
+    with FixtureServer() as server:
+        for posts in args.posts:
+            for definition in definitions:
+                engine = args.engine or definition.engine
+                if engine == engines.HTTP and definition.engine == engines.SELENIUM:
+                    print(f'Skipping {definition.name}: it needs a browser.', file=sys.stderr)
+                    continue
+                if engine == engines.SELENIUM:
+                    if chromedriver is None:
+                        chromedriver = _chromedriver_available()
+                    if not chromedriver:
+                        continue
+
+                urls = {
+                    label: server.url(definition.name, i, posts, args.seed)
+                    for i, label in enumerate(definition.urls)
+                }
+                results = []
+                for _ in range(args.repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        results.append(executor.submit(run_source, definition.name, engine, urls).result())
+                summary = _summary(results)
+                summary['posts'] = posts
+                summaries.append(summary)
+
+    header = (
+        f'{"source":<16} {"engine":<9} {"posts":>5} {"rows":>5} {"start s":>8} '
+        f'{"scrape s":>9} {"load s":>8} {"find s":>8} {"fields s":>9} {"calls":>6} {"rss MB":>7} {"child MB":>9}'
+    )
+    print(header)
+    print('-' * len(header))
+    for s in summaries:
+        print(
+            f'{s["source"]:<16} {s["engine"]:<9} {s["posts"]:>5} {s["rows"]:>5} '
+            f'{s["driver_start"]:>8.3f} {s["scrape"]:>9.3f} {s["page_load"]:>8.3f} '
+            f'{s["find"]:>8.3f} {s["fields"]:>9.3f} {s["calls"]:>6} {s["peak_rss_mb"]:>7.1f} {s["peak_rss_children_mb"]:>9.1f}'
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
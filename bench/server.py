@@ -0,0 +1,180 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+from datetime import datetime, timedelta
+import threading
+import hashlib
+import random
+import os
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MONTHS = [
+    'януари', 'февруари', 'март', 'април', 'май', 'юни',
+    'юли', 'август', 'септември', 'октомври', 'ноември', 'декември'
+]
+
+WORDS = [
+    'авария', 'водоснабдяване', 'спиране', 'ремонт', 'улица', 'квартал',
+    'село', 'електрозахранване', 'топлоподаване', 'абонати', 'мрежа',
+    'водопровод', 'планирано', 'прекъсване', 'часа', 'район', 'Перник',
+    'Изток', 'Мошино', 'Тева', 'Радомир', 'Брезник', 'Батановци', 'Ралица'
+]
+
+# the newest post of every listing
+NEWEST_DATE = datetime(2022, 6, 1, 12, 0, 0)
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_DIR, file_name), encoding='utf-8') as f:
+        return f.read()
+
+
+def fill(template, values):
+    for key, value in values.items():
+        template = template.replace('{{' + key + '}}', str(value))
+    return template
+
+
+def _pagination(source_name, page, pages, page_url):
+    file_name = f'{source_name}.pagination.html'
+    if pages <= 1 or not os.path.exists(os.path.join(FIXTURES_DIR, file_name)):
+        return ''
+    lines = read_fixture(file_name).splitlines()
+    # the first and the last page have no link to the page before / after
+    if page == 1:
+        lines = [line for line in lines if '{{previous_url}}' not in line]
+    if page == pages:
+        lines = [line for line in lines if '{{next_url}}' not in line]
+    return fill('\n'.join(lines), {
+        'page': page,
+        'previous_url': page_url(page - 1),
+        'next_url': page_url(page + 1)
+    })
+
+
+def render_listing(source_name, label, posts, base_url, seed=0, page=1, pages=1, page_url=None, first=0):
+    '''Renders a listing page of a source with `posts` synthetic posts.
+
+    The posts are generated from a fixed seed, so every request for the same
+    page returns exactly the same html. With `pages` > 1 the listing is an
+    archive of that many pages, each older than the one before, linked with
+    the pagination of the source; `page_url(page)` returns their urls.
+    `first` is the index of the newest post, so the listing can be served
+    as it was before its `first` newest posts were published.
+    '''
+    template = read_fixture(f'{source_name}.html')
+    post_template = read_fixture(f'{source_name}.post.html')
+    # the first page is generated as before the archives existed, so the benchmarks stay comparable
+    rng = random.Random(f'{seed}-{source_name}-{label}' + (f'-{page}' if page > 1 else ''))
+
+    rendered_posts = []
+    start = (page - 1) * posts + first
+    # the posts before `first` are generated too, so a post is the same with any `first`
+    for i in range((page - 1) * posts, start + posts):
+        date = NEWEST_DATE - timedelta(hours=7 * i)
+        title = ' '.join(rng.choice(WORDS) for _ in range(6)).capitalize()
+        content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+        if i < start:
+            continue
+        rendered_posts.append(fill(post_template, {
+            'index': i,
+            'title': title,
+            'content': content,
+            'url': f'{base_url}/{source_name}/posts/{i}',
+            'date_dotted': date.strftime('%d.%m.%Y'),
+            'date_dotted_time': date.strftime('%d.%m.%Y, %H:%M:%S'),
+            'date_month_name': f'{date.day:02d} {MONTHS[date.month - 1]} {date.year}'
+        }))
+
+    return fill(template, {
+        'label': label,
+        'posts': '\n'.join(rendered_posts),
+        'pagination': _pagination(source_name, page, pages, page_url) if page_url else ''
+    })
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # the urls look like /<source name>/<label>?posts=<number of posts>,
+        # with &pages=<number of pages>&page=<page> for an archive and
+        # &first=<index of the newest post>
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        query = parse_qs(url.query)
+        if len(parts) != 2 or not os.path.exists(os.path.join(FIXTURES_DIR, f'{parts[0]}.html')):
+            self.send_error(404)
+            return
+
+        def page_url(page):
+            page_query = {k: v[0] for k, v in query.items()}
+            page_query['page'] = page
+            return f'{self.server.base_url}{url.path}?{urlencode(page_query)}'
+
+        pages = int(query.get('pages', ['1'])[0])
+        page = int(query.get('page', ['1'])[0])
+        if not 1 <= page <= pages:
+            self.send_error(404)
+            return
+
+        body = render_listing(
+            parts[0],
+            parts[1],
+            int(query.get('posts', ['20'])[0]),
+            self.server.base_url,
+            int(query.get('seed', ['0'])[0]),
+            page=page,
+            pages=pages,
+            page_url=page_url,
+            first=int(query.get('first', ['0'])[0])
+        ).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the benchmark output clean
+        pass
+
+
+class FixtureServer:
+    '''Serves listing pages with synthetic posts from a local HTTP server.'''
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = 'http://{}:{}'.format(*self.httpd.server_address)
+        self.httpd.base_url = self.base_url
+        self._thread = None
+
+    def url(self, source_name, label_index, posts, seed=0, pages=1, first=0):
+        url = f'{self.base_url}/{source_name}/{label_index}?posts={posts}&seed={seed}'
+        if pages > 1:
+            url += f'&pages={pages}'
+        if first:
+            url += f'&first={first}'
+        return url
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,218 @@
+from flask import Blueprint, Response, request
+from datetime import date, timedelta
+import functools
+import hashlib
+import base64
+import json
+
+from src.payloads import read_table_payload
+from src.scheduler import read_version
+from src.locality import ACTIVE_DAYS
+from src.store import DATE_FORMAT
+from src import feeds
+
+
+# the number of updates per page of /api/updates
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+# the number of updates in a feed
+FEED_SIZE = 50
+
+# for how long (in seconds) the clients may reuse a response without asking
+MAX_AGE = 60
+
+# the exact match filters of /api/updates and the feeds
+FILTER_PARAMS = ['municipality', 'institution', 'label']
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _json(data, status=200):
+    return Response(
+        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        status=status,
+        mimetype='application/json'
+    )
+
+
+def encode_cursor(update):
+    position = json.dumps([update['date'], update['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(position).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        date, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise BadRequest('Invalid cursor.')
+    return date, key
+
+
+def _filters(args):
+    filters = [
+        (column, '=', args[column])
+        for column in FILTER_PARAMS
+        if args.get(column)
+    ]
+    since = args.get('since')
+    if since:
+        # the stored dates are 'YYYY-MM-DD HH:MM:SS', so a prefix compares correctly
+        since = since.replace('T', ' ')
+        if len(since) < 10 or not since[: 4].isdigit():
+            raise BadRequest('`since` must be an ISO date, e.g. 2022-05-13 or 2022-05-13T10:15.')
+        filters.append(('date', '>=', since))
+    return filters
+
+
+def _limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('`limit` must be a number.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def cached(cache, key=None):
+    '''Serves a route only when the stored updates changed.
+
+    The ETag is derived from the data version and the query, so a client
+    which already has the response gets a 304 without touching the store.
+    `key` returns anything else the response depends on, e.g. the day.
+    '''
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = read_version(cache)
+            extra = key() if key else ''
+            etag = hashlib.sha1(
+                f'{version}\n{extra}\n{request.path}\n{request.query_string.decode("utf-8")}'.encode('utf-8')
+            ).hexdigest()
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                try:
+                    response = view(*args, **kwargs)
+                except BadRequest as e:
+                    return _json({'error': str(e)}, status=400)
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = MAX_AGE
+            return response
+        return wrapper
+    return decorator
+
+
+def _days(args):
+    try:
+        days = int(args.get('days', ACTIVE_DAYS))
+    except ValueError:
+        raise BadRequest('`days` must be a number.')
+    return max(1, days)
+
+
+def create_api(cache, store, locality=None):
+    '''Returns the blueprint of the read-only API and the feeds.'''
+    api = Blueprint('api', __name__)
+    locality_version = [None]
+
+    @api.route('/api/table')
+    def serve_table():
+        '''The first pages of rows of the Dash table of the latest snapshot, newest first.
+
+        The older updates are paged through with /api/updates.
+        '''
+        payload = read_table_payload(cache)
+        if payload is None:
+            return Response(
+                '{"error": "The first scrape is still running."}',
+                status=503,
+                mimetype='application/json',
+                headers={'Retry-After': '60'}
+            )
+
+        response = Response(mimetype='application/json')
+        response.set_etag(payload['etag'])
+        # the clients revalidate with the ETag, which costs a cache read
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        if 'gzip' in request.accept_encodings:
+            response.set_data(payload['gzip'])
+            response.content_encoding = 'gzip'
+        else:
+            response.set_data(payload['json'])
+        return response.make_conditional(request)
+
+    @api.route('/api/updates')
+    @cached(cache)
+    def serve_updates():
+        '''The stored updates, newest first, a page at a time.
+
+        Filters: municipality, institution, label (exact) and since (an
+        ISO date). The `next` cursor of a response gives the next page.
+        '''
+        cursor = request.args.get('cursor')
+        limit = _limit(request.args)
+        updates = store.query_after(
+            filters=_filters(request.args),
+            after=decode_cursor(cursor) if cursor else None,
+            limit=limit
+        )
+        return _json({
+            'updates': updates,
+            'next': encode_cursor(updates[-1]) if len(updates) == limit else None
+        })
+
+    @api.route('/api/locality')
+    # the window of `days` moves every day
+    @cached(cache, key=lambda: date.today().isoformat())
+    def serve_locality():
+        '''The recent updates which mention a street and/or a place.
+
+        Parameters: street, place (a village, town, district or
+        municipality) and days (how recent the updates are, by default
+        ACTIVE_DAYS, counted from midnight). A partial last word matches
+        too, e.g. street=Васил Лев.
+        '''
+        street = request.args.get('street', '').strip()
+        place = request.args.get('place', '').strip()
+        if not street and not place:
+            raise BadRequest('Give a `street`, a `place` or both.')
+        if locality is None:
+            raise BadRequest('The locality index is disabled.')
+
+        version = read_version(cache)
+        if locality_version[0] != version:
+            # index the updates stored by the scrapes since the last request
+            locality.refresh()
+            locality_version[0] = version
+        # from midnight, so the response changes only with the day, as the ETag
+        since = (date.today() - timedelta(days=_days(request.args))).strftime(DATE_FORMAT)
+        rowids = locality.query(street=street, place=place, since=since, limit=_limit(request.args))
+        return _json({'updates': store.by_rowids(rowids)})
+
+    def _feed_title():
+        names = [request.args.get(p) for p in ['institution', 'municipality']]
+        return 'MuNews - ' + (' '.join(n for n in names if n) or 'Новини от български общини')
+
+    @api.route('/feed.rss')
+    @cached(cache)
+    def serve_rss():
+        updates = store.query_after(filters=_filters(request.args), limit=FEED_SIZE)
+        return Response(
+            feeds.rss(updates, _feed_title(), request.url_root, 'Новини от български общини'),
+            mimetype='application/rss+xml'
+        )
+
+    @api.route('/feed.atom')
+    @cached(cache)
+    def serve_atom():
+        updates = store.query_after(filters=_filters(request.args), limit=FEED_SIZE)
+        return Response(
+            feeds.atom(updates, _feed_title(), request.url_root, request.url),
+            mimetype='application/atom+xml'
+        )
+
+    return api
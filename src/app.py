@@ -0,0 +1,479 @@
+from dash import Dash, Input, Output, State, dcc, html, no_update
+from flask import Response
+import dash_bootstrap_components as dbc
+from dash.dash_table import DataTable
+import diskcache
+import atexit
+import os
+import traceback
+
+from src.scheduler import SnapshotScheduler, read_snapshot, read_progress, read_version, snapshot_age
+from src.jobs import ScrapeJob
+from src.registry import load_sources
+from src.store import UpdateStore
+from src.workers import ProcessBackend
+from src.payloads import TablePayloads, read_table_page
+from src.api import create_api
+from src.locality import LocalityIndex
+from src.events import UpdateBroadcaster, create_events
+from src.policy import read_source_status, DEFAULT_POLICY, OK
+from src.recaptcha import RecaptchaVerifier, GoogleVerifier
+from src import metrics
+from src import table
+from src.logger import create_logger
+
+# LOG_FORMAT=json writes the logs as JSON lines, LOG_LEVEL=DEBUG logs every scraped update
+LOG_JSON = os.environ.get('LOG_FORMAT') == 'json'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+logger = create_logger('bg_municipal_updates', 'logs', json_format=LOG_JSON, level=LOG_LEVEL)
+
+
+# setup diskcache
+cache = diskcache.Cache('./cache')
+
+
+app = Dash(
+    __name__,
+    # the app lives in src/, the assets next to main.py
+    assets_folder=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets'),
+    external_stylesheets=[dbc.themes.BOOTSTRAP],
+    title='MuNews - Новини от български общини',
+    update_title='MuNews - Нoвини от български общини',
+    external_scripts=['https://www.google.com/recaptcha/api.js?render=explicit']
+)
+
+
+# recaptcha sitkey and secret
+app.server.config['RECAPTCHA_SITEKEY'] = '<fill-your-value>'
+app.server.config['RECAPTCHA_SECRET'] = '<fill-your-value>'
+# the tokens are verified in the web process, so all the callbacks share the
+# keep-alive connection of the verifier to Google
+recaptcha = RecaptchaVerifier(
+    GoogleVerifier(app.server.config['RECAPTCHA_SECRET']),
+    cache=cache,
+    logger=logger
+)
+atexit.register(recaptcha.close)
+
+
+# how often (in seconds) the scrapers are run in the background
+app.server.config['SCRAPE_INTERVAL'] = 60 * 60
+# how often (in milliseconds) a page refreshes the progress of a running scrape
+app.server.config['PROGRESS_INTERVAL'] = 2000
+# how often (in milliseconds) a page checks whether a scrape has started
+app.server.config['PROGRESS_IDLE_INTERVAL'] = 30000
+# the longest (in seconds) a scrape can take, including storing its snapshot;
+# a scrape whose worker died stops blocking the next ones after this
+app.server.config['SCRAPE_TIMEOUT'] = DEFAULT_POLICY.run_seconds() + 5 * 60
+app.server.config['DATABASE'] = './data/updates.db'
+# how many pages a server process pushes the new updates to; the others
+# reconnect later (every open page holds a thread of the development server)
+app.server.config['EVENTS_MAX_CLIENTS'] = 200
+sources = load_sources()
+store = UpdateStore(app.server.config['DATABASE'])
+# the scrapes (and their Chrome instances) run in a worker process
+workers = ProcessBackend(
+    initializer=create_logger,
+    initargs=(logger.name, 'logs', LOG_JSON, LOG_LEVEL)
+)
+atexit.register(workers.shutdown)
+scheduler = SnapshotScheduler(
+    cache,
+    ScrapeJob(app.server.config['DATABASE'], cache=cache),
+    app.server.config['SCRAPE_INTERVAL'],
+    logger,
+    workers=workers,
+    # the table of every snapshot is precomputed by the workers
+    on_snapshot=TablePayloads(app.server.config['DATABASE'], cache),
+    timeout=app.server.config['SCRAPE_TIMEOUT']
+)
+# the updates which mention a street or a place, for /api/locality
+locality = LocalityIndex(store)
+app.server.register_blueprint(create_api(cache, store, locality=locality))
+# the open pages get the new updates pushed as the scrapes store them
+broadcaster = UpdateBroadcaster(cache, store, logger, max_clients=app.server.config['EVENTS_MAX_CLIENTS'])
+app.server.register_blueprint(create_events(broadcaster))
+# for the WSGI servers, e.g. gunicorn src.app:server
+server = app.server
+
+
+app.layout = dbc.Container([
+    dbc.Row(
+        dbc.Col([
+            html.H1('MuNews'),
+            html.P('Новини от български общини')
+        ])
+    ),
+    dbc.Row(
+        dbc.Col(
+            html.H2(
+                ('Община ' if len({s.municipality for s in sources}) == 1 else 'Общини ')
+                + ', '.join(sorted({s.municipality for s in sources}))
+            )
+        )
+    ),
+    dbc.Row([
+        dbc.Col(
+            dbc.Button(
+                'Извлечи',
+                color='outline-info',
+                id='scrape-button',
+                n_clicks=0
+            )
+        ),
+        dbc.Col(
+            dbc.Progress(
+                id='progress-bar',
+                color='info',
+                striped=True
+            ),
+            width=9
+        )
+    ]),
+    dbc.Row(
+        dbc.Col([
+            html.Div(id='scrape-recaptcha'),
+            html.Div(id='scrape-recaptcha-response', style={'display': 'none'}),
+            dcc.Store(id='recaptcha-verified', data=False),
+            dcc.Store(id='data-version', data=0),
+            # slows down while no scrape is in progress, the rows themselves are pushed
+            dcc.Interval(
+                id='progress-interval',
+                interval=app.server.config['PROGRESS_IDLE_INTERVAL'],
+                disabled=True
+            ),
+            # the rows of the current page, before the pushed updates are merged
+            dcc.Store(id='table-rows', data=[]),
+            # assets/live-updates.js clicks the trigger when updates are pushed
+            html.Button(id='live-updates-trigger', n_clicks=0, style={'display': 'none'}),
+            dcc.Store(id='live-rows', data=[]),
+            dcc.Store(id='live-reload', data=0)
+        ])
+    ),
+    dbc.Row(
+        dbc.Col(
+            html.P('', id='error-message', style={'color': 'red'})
+        )
+    ),
+    dbc.Row(
+        dbc.Col(
+            html.P('', id='snapshot-age')
+        )
+    ),
+    dbc.Row(
+        dbc.Col(
+            html.Ul([], id='source-status', style={'color': 'darkorange'})
+        )
+    ),
+    dbc.Row(
+        dbc.Col(
+            dbc.Input(
+                id='search',
+                type='search',
+                placeholder='Търсене в заглавията и съдържанието...',
+                debounce=True
+            )
+        )
+    ),
+    dbc.Row(
+        dbc.Col(
+            DataTable(
+                id='scraped-data',
+                data=[],
+                columns=[
+                    {
+                        'name': 'Дата (ISO)',
+                        'id': 'date_iso',
+                        'type': 'datetime'
+                    },
+                    {
+                        'name': 'Дата',
+                        'id': 'date_bg',
+                        'type': 'datetime'
+                    },
+                    {
+                        'name': 'Институция',
+                        'id': 'institution',
+                        'type': 'text'
+                    },
+                    {
+                        'name': 'Категория',
+                        'id': 'label',
+                        'type': 'text'
+                    },
+                    {
+                        'name': 'Заглавие',
+                        'id': 'title',
+                        'type': 'text'
+                    },
+                    {
+                        'name': 'Съдържание',
+                        'id': 'content',
+                        'type': 'text'
+                    },
+                    {
+                        'name': 'Връзка',
+                        'id': 'link',
+                        'type': 'text',
+                        'presentation': 'markdown'
+                    }
+                ],
+                hidden_columns=['date_iso'],
+                page_action='custom',
+                page_current=0,
+                page_size=table.PAGE_SIZE,
+                page_count=0,
+                filter_action='custom',
+                filter_query='',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[
+                    {
+                        'column_id': 'date_iso',
+                        'direction': 'desc'
+                    }
+                ],
+                style_as_list_view=True,
+                style_header={
+                    'backgroundColor': 'rgb(30, 30, 30)',
+                    'color': 'white'
+                },
+                style_filter={
+                    'backgroundColor': 'rgb(30, 30, 30)',
+                    'color': 'white'
+                },
+                style_data={
+                    'backgroundColor': 'rgb(50, 50, 50)',
+                    'color': 'white'
+                },
+                style_cell={
+                    'whiteSpace': 'pre-line',
+                    'textAlign': 'left',
+                    'padding': '5px'
+                }
+            )
+        )
+    )
+])
+
+
+app.clientside_callback(
+    '''
+    function(n_clicks) {
+        if (n_clicks == 0){
+            grecaptcha.render('scrape-recaptcha', {'sitekey' : '_sitekey'});
+        }
+        if (n_clicks > 0){
+            var recaptcha_response = document.getElementById('g-recaptcha-response');
+            return recaptcha_response.value;
+        }
+    }
+    '''.replace('_sitekey', app.server.config['RECAPTCHA_SITEKEY']),
+    Output('scrape-recaptcha-response', 'children'), 
+    Input('scrape-button', 'n_clicks')
+)
+
+
+@app.callback(
+    Output('recaptcha-verified', 'data'),
+    Output('scrape-button', 'disabled'),
+    Output('error-message', 'children'),
+    Output('data-version', 'data'),
+    Input('scrape-button', 'n_clicks'),
+    Input('scrape-recaptcha-response', 'children')
+)
+def scrape_data(n_clicks, recaptcha_response):
+    if n_clicks < 1:
+        return [False, False, '', 0]
+
+    if recaptcha.verify(recaptcha_response):
+        version = read_version(cache)
+        # the updates stored later are pushed to the page through /events
+        # (see assets/live-updates.js), so there is nothing to wait for here
+        return [True, True, '', version]
+    return [False, False, '', 0]
+
+
+@app.callback(
+    Output('progress-bar', 'label'),
+    Output('progress-bar', 'value'),
+    Output('progress-bar', 'style'),
+    Output('progress-interval', 'disabled'),
+    Output('progress-interval', 'interval'),
+    Input('recaptcha-verified', 'data'),
+    Input('progress-interval', 'n_intervals')
+)
+def show_progress(recaptcha_verified, n_intervals):
+    if not recaptcha_verified:
+        return '', 0, {'height': '100%', 'visibility': 'hidden'}, True, no_update
+    scrape_progress = read_progress(cache)
+    if scrape_progress is None:
+        # the scheduled scrapes start without a click, so keep checking slowly
+        return (
+            '',
+            0,
+            {'height': '100%', 'visibility': 'hidden'},
+            False,
+            app.server.config['PROGRESS_IDLE_INTERVAL']
+        )
+    return (
+        f'Извличане: {scrape_progress}%',
+        scrape_progress,
+        {'height': '100%', 'visibility': 'visible'},
+        False,
+        app.server.config['PROGRESS_INTERVAL']
+    )
+
+
+app.clientside_callback(
+    '''
+    function(n_clicks, page_current, sort_by, filter_query, search, recaptcha_verified, reload) {
+        var pushed = window.liveUpdates || {rows: [], reload: false};
+        var rows = pushed.rows;
+        var must_reload = pushed.reload;
+        pushed.rows = [];
+        pushed.reload = false;
+        if (!recaptcha_verified || (!rows.length && !must_reload)) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        var default_view = page_current == 0 && !filter_query && !search && sort_by
+            && sort_by.length == 1 && sort_by[0].column_id == 'date_iso' && sort_by[0].direction == 'desc';
+        if (default_view && !must_reload) {
+            return [rows, window.dash_clientside.no_update];
+        }
+        // the new rows may belong anywhere in this view, so query it again
+        return [window.dash_clientside.no_update, (reload || 0) + 1];
+    }
+    ''',
+    Output('live-rows', 'data'),
+    Output('live-reload', 'data'),
+    Input('live-updates-trigger', 'n_clicks'),
+    State('scraped-data', 'page_current'),
+    State('scraped-data', 'sort_by'),
+    State('scraped-data', 'filter_query'),
+    State('search', 'value'),
+    State('recaptcha-verified', 'data'),
+    State('live-reload', 'data')
+)
+
+
+app.clientside_callback(
+    '''
+    function(table_rows, live_rows, data, page_size) {
+        var triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+        if (!triggered.includes('live-rows.data')) {
+            return table_rows;
+        }
+        // the newest first, without the rows which are already shown
+        var shown = new Set((data || []).map(row => row.id));
+        var rows = live_rows.filter(row => !shown.has(row.id)).concat(data || []);
+        rows.sort((a, b) => a.date_iso < b.date_iso ? 1 : a.date_iso > b.date_iso ? -1 : 0);
+        return rows.slice(0, page_size);
+    }
+    ''',
+    Output('scraped-data', 'data'),
+    Input('table-rows', 'data'),
+    Input('live-rows', 'data'),
+    State('scraped-data', 'data'),
+    State('scraped-data', 'page_size')
+)
+
+
+@app.callback(
+    Output('table-rows', 'data'),
+    Output('scraped-data', 'page_count'),
+    Output('snapshot-age', 'children'),
+    Output('source-status', 'children'),
+    Input('recaptcha-verified', 'data'),
+    Input('data-version', 'data'),
+    Input('live-reload', 'data'),
+    Input('scraped-data', 'page_current'),
+    Input('scraped-data', 'page_size'),
+    Input('scraped-data', 'sort_by'),
+    Input('scraped-data', 'filter_query'),
+    Input('search', 'value')
+)
+def query_data(recaptcha_verified, data_version, live_reload, page_current, page_size, sort_by, filter_query, search):
+    if not recaptcha_verified:
+        return [], 0, '', []
+
+    try:
+        with metrics.QUERY_SECONDS.time():
+            filters = table.filters(filter_query)
+            order_by = table.order_by(sort_by)
+            page = None
+            if not filters and not search and order_by in ([], [('date', True)]):
+                # the default view of the latest snapshot is precomputed; it must
+                # match the current version, not the one of the click, since a
+                # running scrape stores (and pushes) updates before it ends
+                page = read_table_page(cache, read_version(cache), page_current, page_size)
+            if page is not None:
+                records, count = page
+            else:
+                count = store.count(search, filters)
+                records = table.table_records(store.query_frame(
+                    search=search,
+                    filters=filters,
+                    order_by=order_by,
+                    offset=page_current * page_size,
+                    limit=page_size
+                ))
+
+        snapshot = read_snapshot(cache)
+        if snapshot is not None:
+            age_minutes = int(snapshot_age(snapshot) // 60)
+            age_message = f'Последно обновяване: преди {age_minutes} мин.'
+        elif count == 0:
+            age_message = 'Данните все още се подготвят. Опитайте отново след малко.'
+        else:
+            # the first scrape is still running
+            age_message = ''
+        scrape_progress = read_progress(cache)
+        if scrape_progress is not None:
+            age_message += f' Обновяване в момента: {scrape_progress}%'
+        return [
+            records,
+            max(1, -(-count // page_size)),
+            age_message,
+            source_status()
+        ]
+
+    except Exception as e:
+        logger.error(str(e) + '\n' + traceback.format_exc())
+        return [], 0, 'Възникна грешка! Свържете се с разработчика!', []
+
+
+STATUS_MESSAGES = {
+    'failed': 'неуспешно извличане',
+    'timeout': 'изтекло време за извличане',
+    'skipped': 'пропуснат след повтарящи се грешки'
+}
+
+
+def source_status():
+    '''Lists the listings which weren't scraped successfully last time.'''
+    definitions = {s.name: s for s in sources}
+    items = []
+    for status in read_source_status(cache).values():
+        definition = definitions.get(status['source'])
+        if status['status'] == OK or definition is None:
+            continue
+        items.append(html.Li(
+            f'{definition.municipality} {definition.institution} ({status["label"]}): '
+            f'{STATUS_MESSAGES[status["status"]]}'
+        ))
+    return items
+
+
+@app.server.route('/metrics')
+def serve_metrics():
+    return Response(
+        metrics.REGISTRY.render(cache),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+
+def run():
+    # the workers resolve the Chrome webdriver when they first need it
+    scheduler.start()
+    app.run_server(debug=False, host='0.0.0.0')
@@ -0,0 +1,288 @@
+'''Imports the archives of the sources by following their pagination:
+
+    > python -m src.backfill
+    > python -m src.backfill --sources pernik-vik --since 2019-01-01 --rate 1
+    > python -m src.backfill --restart
+
+Only the sources with a `pagination` in the registry have an archive. The
+crawl is resumable: the position in every listing is checkpointed in the
+cache together with the stored updates, so an interrupted backfill
+continues where it stopped.
+'''
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from datetime import datetime
+import contextlib
+import threading
+import argparse
+import time
+
+from src.drivers import DriverPool, create_chrome
+from src.registry import load_sources
+from src.logger import create_logger
+from src.policy import SourcePolicy
+from src.store import UpdateStore
+from src import engines
+
+
+CHECKPOINT_KEY_PREFIX = 'backfill:'
+
+# the default politeness towards every host of the sources
+DEFAULT_RATE = 2
+DEFAULT_BURST = 4
+
+
+class TokenBucket:
+    '''Allows `rate` requests per second on average and bursts of `burst`.'''
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Waits until a request is allowed.'''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    '''A token bucket per host, shared by all the listings on that host.'''
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+        bucket.acquire()
+
+
+class Checkpoints:
+    '''The position of the backfill in every listing, kept in a diskcache.'''
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _key(self, name, label):
+        return f'{CHECKPOINT_KEY_PREFIX}{name}:{label}'
+
+    def get(self, name, label):
+        return self.cache.get(self._key(name, label))
+
+    def set(self, name, label, checkpoint):
+        self.cache.set(self._key(name, label), checkpoint)
+
+    def clear(self, name, label):
+        self.cache.delete(self._key(name, label))
+
+
+class BatchWriter:
+    '''Stores the updates of all the listings in batches.
+
+    The checkpoints which come with the updates are saved only after the
+    batch holding their updates is stored, so a resumed backfill never
+    skips updates which were crawled but not stored.
+    '''
+    def __init__(self, store, checkpoints, batch_size=500):
+        self.store = store
+        self.checkpoints = checkpoints
+        self.batch_size = batch_size
+        self.stored = 0
+        self._updates = []
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+
+    def add(self, updates, name, label, checkpoint):
+        with self._lock:
+            self._updates += updates
+            self._checkpoints[(name, label)] = checkpoint
+            if len(self._updates) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._updates:
+            self.stored += len(self.store.append(self._updates, move_marks=False))
+        for (name, label), checkpoint in self._checkpoints.items():
+            self.checkpoints.set(name, label, checkpoint)
+        self._updates = []
+        self._checkpoints = {}
+
+
+class Backfill:
+    '''Crawls the archives of the sources concurrently.
+
+    Every listing is crawled page after page by a task of its own, while
+    the requests to every host are limited by `limiter`. A listing ends at
+    the last page, at a page without updates, at a page older than `since`
+    or after `max_pages` pages; a page which keeps failing after the
+    retries of `policy` stops the listing until the next backfill.
+    '''
+    def __init__(self, store, cache, logger, limiter=None, policy=None, workers=4,
+                 batch_size=500, max_pages=None, since=None, pool=None):
+        self.store = store
+        self.checkpoints = Checkpoints(cache)
+        self.logger = logger
+        self.limiter = limiter or HostLimiter()
+        self.policy = policy or SourcePolicy()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_pages = max_pages
+        self.since = since
+        self.pool = pool
+
+    def _load(self, source, url, label):
+        for attempt in range(self.policy.retries + 1):
+            self.limiter.acquire(url)
+            try:
+                return list(source.iter_page(url, label))
+            except Exception as e:
+                self.logger.error(f'Loading {url} failed (attempt {attempt + 1}): {type(e).__name__}: {e}')
+                if attempt == self.policy.retries:
+                    raise
+            time.sleep(self.policy.backoff_seconds(attempt))
+
+    def _crawl(self, driver, source_class, label, writer):
+        name = source_class.name
+        checkpoint = self.checkpoints.get(name, label) or {
+            'url': source_class.urls[label],
+            'page': 1,
+            'done': False
+        }
+        if checkpoint['done']:
+            self.logger.info(f'The archive of {name} ({label}) is already imported.')
+            return 0
+
+        source = source_class(driver, labels=[label], scrape=False)
+        url, page, crawled = checkpoint['url'], checkpoint['page'], 0
+        previous_keys = None
+        while url:
+            try:
+                updates = self._load(source, url, label)
+            except Exception:
+                # the listing continues from this page next time
+                return crawled
+
+            crawled += 1
+            self.logger.info(f'Crawled page {page} of {name} ({label}): {len(updates)} updates.')
+            # not by update_key, the updates without links of their own
+            # get the url of the page
+            keys = {(u['title'], u['content'], u['date']) for u in updates}
+            if updates and keys == previous_keys:
+                # the site ignored the page number and served the same page
+                updates, next_url = [], None
+            elif updates or 'next' in source.pagination:
+                # a next link is followed past the pages whose updates were
+                # all left out (e.g. the news of other municipalities)
+                next_url = source.next_page_url(label, page)
+            else:
+                next_url = None
+            if next_url == url:
+                next_url = None
+            previous_keys = keys
+            if self.since and updates and max(u['date'] for u in updates) < self.since:
+                next_url = None
+            writer.add(updates, name, label, {'url': next_url, 'page': page + 1, 'done': next_url is None})
+            if self.max_pages and crawled >= self.max_pages:
+                # stop here, the next backfill goes on from the next page
+                break
+            url, page = next_url, page + 1
+        return crawled
+
+    def _task(self, session, source_class, label, writer):
+        if source_class.engine == engines.HTTP:
+            return self._crawl(engines.HttpDriver(session), source_class, label, writer)
+        with self.pool.driver() as driver:
+            return self._crawl(driver, source_class, label, writer)
+
+    def run(self, sources, restart=False):
+        '''Backfills the listings of `sources` and returns the number of new updates.'''
+        tasks = [
+            (definition.source_class(), label)
+            for definition in sources
+            for label in definition.urls
+        ]
+        if restart:
+            for source_class, label in tasks:
+                self.checkpoints.clear(source_class.name, label)
+        tasks = [(s, label) for s, label in tasks if s.pagination]
+        if not tasks:
+            self.logger.info('None of the sources has a pagination to follow.')
+            return 0
+
+        if self.pool is None:
+            self.pool = DriverPool(create_chrome, self.workers, logger=self.logger)
+            pool_context = self.pool
+        else:
+            pool_context = contextlib.nullcontext(self.pool)
+
+        writer = BatchWriter(self.store, self.checkpoints, self.batch_size)
+        session = engines.create_session(self.workers)
+        with session, pool_context:
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    futures = {
+                        executor.submit(self._task, session, source_class, label, writer): (source_class, label)
+                        for source_class, label in tasks
+                    }
+                    for future in as_completed(futures):
+                        source_class, label = futures[future]
+                        try:
+                            pages = future.result()
+                            self.logger.info(f'Backfilled {pages} pages of {source_class.name} ({label}).')
+                        except Exception as e:
+                            self.logger.error(f'Backfilling {source_class.name} ({label}) failed: {e}')
+            finally:
+                writer.flush()
+
+        self.logger.info(f'Done backfilling. Stored {writer.stored} new updates.')
+        return writer.stored
+
+
+def main(argv=None):
+    import diskcache
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', nargs='*', help='the names of the sources to backfill (default: all)')
+    parser.add_argument('--db', default='./data/updates.db', help='the update store')
+    parser.add_argument('--cache', default='./cache', help='the cache with the checkpoints')
+    parser.add_argument('--since', help='stop at the pages older than this date, e.g. 2019-01-01')
+    parser.add_argument('--max-pages', type=int, help='the number of pages per listing in this run')
+    parser.add_argument('--workers', type=int, default=4, help='the number of listings crawled at a time')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='the requests per second to a host')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='the burst of requests to a host')
+    parser.add_argument('--batch-size', type=int, default=500, help='the number of updates stored at once')
+    parser.add_argument('--restart', action='store_true', help='start from the first pages again')
+    args = parser.parse_args(argv)
+
+    logger = create_logger('bg_municipal_updates', 'logs', level='INFO')
+    backfill = Backfill(
+        UpdateStore(args.db),
+        diskcache.Cache(args.cache),
+        logger,
+        limiter=HostLimiter(args.rate, args.burst),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_pages=args.max_pages,
+        since=datetime.fromisoformat(args.since) if args.since else None
+    )
+    backfill.run(load_sources(names=args.sources), restart=args.restart)
+
+
+if __name__ == '__main__':
+    main()
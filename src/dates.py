@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+import re
+
+
+SOFIA = 'Europe/Sofia'
+
+MONTHS = {
+    'януари': 1,
+    'февруари': 2,
+    'март': 3,
+    'април': 4,
+    'май': 5,
+    'юни': 6,
+    'юли': 7,
+    'август': 8,
+    'септември': 9,
+    'октомври': 10,
+    'ноември': 11,
+    'декември': 12
+}
+MONTH_ABBREVIATIONS = {
+    'яну': 1,
+    'фев': 2,
+    'мар': 3,
+    'апр': 4,
+    'юни': 6,
+    'юли': 7,
+    'авг': 8,
+    'сеп': 9,
+    'септ': 9,
+    'окт': 10,
+    'ное': 11,
+    'дек': 12
+}
+MONTH_NAMES = {**MONTH_ABBREVIATIONS, **MONTHS}
+
+_MONTH_ALTERNATION = '|'.join(sorted(MONTH_NAMES, key=len, reverse=True))
+_TIME = r'(?:,?\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?'
+
+# the known date formats, in the order in which they are tried; a date
+# can't start in the middle of a number
+PATTERNS = [
+    # 13.05.2022, 10:15:00 / 13.05.2022 10:15 / 13.05.2022
+    re.compile(r'(?<!\d)(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})' + _TIME),
+    # 2022-05-13 10:15:00 / 2022-05-13T10:15 / 2022-05-13
+    re.compile(
+        r'(?<!\d)(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+        r'(?:[ T](?P<hour>\d{2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?'
+    ),
+    # 13 май 2022 / 13 септ. 2022 г.
+    re.compile(
+        r'(?<!\d)(?P<day>\d{1,2})\s+(?P<month_name>' + _MONTH_ALTERNATION + r')\.?,?\s+(?P<year>\d{4})' + _TIME,
+        re.IGNORECASE
+    )
+]
+
+_FIELDS = ['year', 'month', 'day', 'hour', 'minute', 'second']
+
+
+def _localize(timestamps, tz):
+    # the clock is moved back one hour in october, so some local times exist
+    # twice; those are treated as the later one (standard time)
+    return timestamps.tz_localize(tz, ambiguous=False, nonexistent='shift_forward')
+
+
+def parse_date(text, tz=None):
+    '''Returns the first date found in the text as a pd.Timestamp.
+
+    With `tz` (e.g. SOFIA) the local time is localized to that time zone.
+    Raises ValueError when the text contains no known date.
+    '''
+    for pattern in PATTERNS:
+        date_match = pattern.search(text)
+        if date_match is None:
+            continue
+        fields = date_match.groupdict()
+        if 'month_name' in fields:
+            month = MONTH_NAMES[fields['month_name'].lower()]
+        else:
+            month = int(fields['month'])
+        try:
+            timestamp = pd.Timestamp(
+                int(fields['year']),
+                month,
+                int(fields['day']),
+                int(fields['hour'] or 0),
+                int(fields['minute'] or 0),
+                int(fields['second'] or 0)
+            )
+        except ValueError:
+            # e.g. 31.02.2022, try the other formats
+            continue
+        return _localize(timestamp, tz) if tz else timestamp
+
+    raise ValueError('No date can be found in the update tag.')
+
+
+def parse_dates(texts, tz=None):
+    '''Parses a column of raw strings in one vectorised pass per format.
+
+    Returns a datetime64 pd.Series aligned with `texts`, with NaT where no
+    date could be found. Repeated strings are only parsed once.
+    '''
+    texts = pd.Series(texts, dtype='object')
+    texts = texts.where(texts.map(lambda t: isinstance(t, str)))
+    codes, uniques = pd.factorize(texts)
+    uniques = pd.Series(uniques, dtype='object')
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+
+    for pattern in PATTERNS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        fields = uniques[missing].str.extract(pattern)
+        if 'month_name' in fields:
+            fields['month'] = fields.pop('month_name').str.lower().map(MONTH_NAMES)
+        fields = fields[_FIELDS].astype(float)
+        fields[['hour', 'minute', 'second']] = fields[['hour', 'minute', 'second']].fillna(0)
+        fields = fields.dropna()
+        if not fields.empty:
+            parsed[fields.index] = pd.to_datetime(fields, errors='coerce')
+
+    # missing values have the code -1, which picks NaT from the extra item
+    parsed = pd.concat([parsed, pd.Series([pd.NaT], dtype='datetime64[ns]')], ignore_index=True)
+    result = pd.Series(parsed.to_numpy()[codes], index=texts.index)
+
+    if tz:
+        return result.dt.tz_localize(
+            tz,
+            ambiguous=np.zeros(len(result), dtype=bool),
+            nonexistent='shift_forward'
+        )
+    return result
@@ -0,0 +1,165 @@
+from selenium.common.exceptions import WebDriverException
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium import webdriver
+import functools
+import threading
+import queue
+
+
+# set selenium to run on the backend
+chrome_options = webdriver.ChromeOptions()
+chrome_options.add_argument('--headless')
+chrome_options.add_argument('--disable-gpu')
+chrome_options.add_argument('--disable-dev-shm-usage')
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_chromedriver():
+    '''Returns the path to the chromedriver binary, downloading it if needed.
+
+    The result is cached, so the driver manager only checks the installed
+    driver version once per process.
+    '''
+    return ChromeDriverManager().install()
+
+
+def create_chrome():
+    return webdriver.Chrome(
+        executable_path=resolve_chromedriver(),
+        options=chrome_options
+    )
+
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class DriverPool:
+    '''A bounded pool of warm webdrivers shared by concurrent scraping tasks.
+
+    Drivers are created lazily by `factory` until `size` of them exist;
+    after that the tasks wait for a driver to be returned to the pool. The
+    drivers stay alive between scrapes and are recycled after `max_uses`
+    tasks, when they fail a health check or when a task using them crashes.
+    '''
+    def __init__(self, factory, size, max_uses=50, logger=None):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.logger = logger
+        self._idle = queue.LifoQueue()
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+
+    def _healthy(self, session):
+        try:
+            # any command fails if the browser has crashed
+            session.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _discard(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+        try:
+            session.driver.quit()
+        except Exception:
+            # the browser may already be gone
+            pass
+
+    def _acquire(self):
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = None
+
+            if session is not None:
+                if self._healthy(session):
+                    return session
+                self._log('Recycling an unhealthy webdriver...')
+                self._discard(session)
+                continue
+
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError('The driver pool has been closed.')
+                can_create = len(self._sessions) < self.size
+                if can_create:
+                    # reserve the slot before the (slow) browser start
+                    session = _Session(None)
+                    self._sessions.add(session)
+
+            if can_create:
+                try:
+                    self._log('Loading Chrome webdriver...')
+                    session.driver = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._sessions.discard(session)
+                    raise
+                return session
+
+            try:
+                # wake up regularly in case a recycled driver freed a slot
+                session = self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._idle.put(session)
+
+    def _release(self, session, crashed=False):
+        session.uses += 1
+        if crashed or self._closed or session.uses >= self.max_uses:
+            self._discard(session)
+        else:
+            self._idle.put(session)
+
+    @property
+    def sessions(self):
+        return len(self._sessions)
+
+    def driver(self):
+        '''Returns a context manager which lends a driver from the pool.'''
+        return _PooledDriver(self)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            sessions, self._sessions = self._sessions, set()
+        for session in sessions:
+            if session.driver is None:
+                continue
+            try:
+                session.driver.quit()
+            except Exception:
+                # the browser may already be gone
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _PooledDriver:
+    def __init__(self, pool):
+        self.pool = pool
+        self.session = None
+
+    def __enter__(self):
+        self.session = self.pool._acquire()
+        return self.session.driver
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # a driver which raised a webdriver error may be in a broken state
+        crashed = exc_type is not None and issubclass(exc_type, WebDriverException)
+        self.pool._release(self.session, crashed=crashed)
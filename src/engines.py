@@ -0,0 +1,176 @@
+from lxml import html as lxml_html
+import requests
+
+
+SELENIUM = 'selenium'
+HTTP = 'http'
+
+# tags which selenium renders on separate lines
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+    'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tbody',
+    'td', 'th', 'thead', 'tr', 'ul'
+}
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template'}
+
+# the default timeout (in seconds) of an HTTP request
+HTTP_TIMEOUT = 30
+
+
+class NoSuchElementError(Exception):
+    pass
+
+
+def create_session(pool_size=10):
+    '''Creates an HTTP session with a connection pool shared by all scrapers.'''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) bg-municipal-updates'
+    return session
+
+
+def _class_xpath(class_name):
+    return (
+        ".//*[contains(concat(' ', normalize-space(@class), ' '), ' {} ')]"
+        .format(class_name)
+    )
+
+
+def _render_text(node, parts):
+    if not isinstance(node.tag, str) or node.tag in SKIPPED_TAGS:
+        # comments and processing instructions have no visible text
+        if node.tail:
+            parts.append(node.tail)
+        return
+
+    block = node.tag in BLOCK_TAGS
+    if block:
+        parts.append('\n')
+    if node.tag == 'br':
+        parts.append('\n')
+    if node.text:
+        parts.append(node.text)
+    for child in node:
+        _render_text(child, parts)
+    if block:
+        parts.append('\n')
+    if node.tail:
+        parts.append(node.tail)
+
+
+def visible_text(node):
+    '''Approximates the `.text` of a selenium element for a parsed node.'''
+    parts = []
+    # the tail does not belong to the element itself
+    tail, node.tail = node.tail, None
+    try:
+        _render_text(node, parts)
+    finally:
+        node.tail = tail
+
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+class _Searchable:
+    '''The subset of the selenium element lookup API used by the scrapers.'''
+    def _root(self):
+        raise NotImplementedError('This method should be overridden by a child class.')
+
+    def find_elements_by_xpath(self, xpath):
+        return [HtmlElement(node) for node in self._root().xpath(xpath)]
+
+    def find_element_by_xpath(self, xpath):
+        elements = self.find_elements_by_xpath(xpath)
+        if not elements:
+            raise NoSuchElementError(f'No element matches: {xpath}')
+        return elements[0]
+
+    def find_elements_by_tag_name(self, tag_name):
+        return self.find_elements_by_xpath(f'.//{tag_name}')
+
+    def find_element_by_tag_name(self, tag_name):
+        return self.find_element_by_xpath(f'.//{tag_name}')
+
+    def find_elements_by_class_name(self, class_name):
+        return self.find_elements_by_xpath(_class_xpath(class_name))
+
+    def find_element_by_class_name(self, class_name):
+        return self.find_element_by_xpath(_class_xpath(class_name))
+
+    def find_elements_by_css_selector(self, css_selector):
+        return [HtmlElement(node) for node in self._root().cssselect(css_selector)]
+
+    def find_element_by_css_selector(self, css_selector):
+        elements = self.find_elements_by_css_selector(css_selector)
+        if not elements:
+            raise NoSuchElementError(f'No element matches: {css_selector}')
+        return elements[0]
+
+
+class HtmlElement(_Searchable):
+    def __init__(self, node):
+        self.node = node
+
+    def _root(self):
+        return self.node
+
+    @property
+    def text(self):
+        return visible_text(self.node)
+
+    def get_attribute(self, name):
+        return self.node.get(name)
+
+
+class HttpDriver(_Searchable):
+    '''A browser-free stand-in for a webdriver for server-rendered pages.
+
+    Pages are downloaded with a (shared) requests session and parsed with
+    lxml, so the scrapers can use the same extraction code for both engines.
+    '''
+    def __init__(self, session, timeout=HTTP_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self.current_url = None
+        self.page_source = None
+        self.response_headers = {}
+        # set when the server answered a conditional request with 304
+        self.not_modified = False
+        self._tree = None
+
+    def _root(self):
+        if self._tree is None:
+            raise NoSuchElementError('No page has been loaded yet.')
+        return self._tree
+
+    def get(self, url, headers=None):
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        self.current_url = response.url
+        self.response_headers = response.headers
+        self.not_modified = response.status_code == 304
+        if self.not_modified:
+            self.page_source = None
+            self._tree = None
+            return
+
+        if 'charset' in response.headers.get('Content-Type', '').lower():
+            self.page_source = response.text
+        else:
+            # let lxml pick up the encoding from the meta tags of the page
+            self.page_source = response.content
+        self.load(self.page_source, self.current_url)
+
+    def load(self, page_source, url):
+        self._tree = lxml_html.document_fromstring(page_source, base_url=url)
+        self._tree.make_links_absolute(url, resolve_base_href=True)
+
+    def quit(self):
+        pass
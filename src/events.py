@@ -0,0 +1,194 @@
+from flask import Blueprint, Response, request, stream_with_context
+import contextlib
+import threading
+import random
+import queue
+import json
+
+from src.scheduler import read_version
+from src import table
+
+
+# how often (in seconds) the broadcaster checks the data version
+POLL_INTERVAL = 1
+# how often (in seconds) an idle stream sends a comment, so that proxies keep it open
+HEARTBEAT_INTERVAL = 15
+# after how long (in milliseconds) the browsers reconnect
+RETRY_MILLISECONDS = 5000
+# the number of events a client may lag behind before it is disconnected
+CLIENT_BACKLOG = 16
+# every open stream holds a server thread, so their number is capped
+MAX_CLIENTS = 200
+# after how long (in seconds) the browsers turned away by a full server try again;
+# spread, so that they don't all come back at once
+BUSY_RETRY_SECONDS = (30, 90)
+# the most updates sent at once; a client which missed more reloads the table
+MAX_REPLAY = 500
+
+
+def _event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class UpdateBroadcaster:
+    '''Pushes the newly stored updates to all the open event streams.
+
+    A single thread per server process watches the data version in the
+    cache, which the scrapes bump whenever they store the updates of a
+    source, and reads the new rows from the store once for all the
+    clients. The thread is started by the first client.
+    '''
+    def __init__(self, cache, store, logger, poll_interval=POLL_INTERVAL, max_clients=MAX_CLIENTS):
+        self.cache = cache
+        self.store = store
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self._clients = set()
+        self._last_rowid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._last_rowid = self.store.last_rowid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='update-broadcaster', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def subscribe(self):
+        '''Returns the event queue of a new client and the rowid it starts after.
+
+        Returns None when there are too many clients already.
+        '''
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            self._start()
+            client = queue.Queue(CLIENT_BACKLOG)
+            self._clients.add(client)
+            return client, self._last_rowid
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def _broadcast(self, message):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                # a stalled client; it catches up from Last-Event-ID when it reconnects
+                self.unsubscribe(client)
+                with contextlib.suppress(queue.Empty):
+                    while True:
+                        client.get_nowait()
+                client.put_nowait(None)
+
+    def _run(self):
+        version = read_version(self.cache)
+        while not self._stop.wait(self.poll_interval):
+            try:
+                new_version = read_version(self.cache)
+                if new_version == version:
+                    continue
+                version = new_version
+                while True:
+                    updates = self.store.updates_after(self._last_rowid, limit=MAX_REPLAY)
+                    if not updates:
+                        break
+                    self._last_rowid = updates[-1]['rowid']
+                    self._broadcast(_event(
+                        'updates',
+                        [table.table_record(u) for u in updates],
+                        event_id=self._last_rowid
+                    ))
+            except Exception as e:
+                self.logger.error(f'Broadcasting the new updates failed: {e}')
+
+    def replay(self, rowid, until):
+        '''Returns the event with the updates a reconnecting client missed.
+
+        Returns a `reload` event when it missed too many of them.
+        '''
+        updates = [u for u in self.store.updates_after(rowid, limit=MAX_REPLAY + 1) if u['rowid'] <= until]
+        if len(updates) > MAX_REPLAY:
+            return _event('reload', {}, event_id=until)
+        if not updates:
+            return None
+        return _event('updates', [table.table_record(u) for u in updates], event_id=updates[-1]['rowid'])
+
+
+def create_events(broadcaster):
+    '''Returns the blueprint of the /events stream.'''
+    events = Blueprint('events', __name__)
+
+    @events.route('/events')
+    def serve_events():
+        '''Newly stored updates as Server-Sent Events, as the scrapes store them.
+
+        Every `updates` event holds a list of rows of the Dash table and
+        the rowid of the last one as its id, so a reconnecting browser
+        gets what it missed through the `Last-Event-ID` header.
+        '''
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        subscription = broadcaster.subscribe()
+        if subscription is None:
+            # EventSource never reconnects after an error status, so a full
+            # server ends an empty stream instead, which is retried later;
+            # its id makes the retry replay what was stored meanwhile
+            if not last_event_id.isdigit():
+                last_event_id = broadcaster.store.last_rowid()
+            retry = random.randint(*BUSY_RETRY_SECONDS) * 1000
+            return Response(
+                f'id: {last_event_id}\nretry: {retry}\n\n',
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache'}
+            )
+        client, last_rowid = subscription
+
+        def stream():
+            try:
+                yield f'retry: {RETRY_MILLISECONDS}\n\n'
+                if last_event_id.isdigit():
+                    missed = broadcaster.replay(int(last_event_id), last_rowid)
+                    if missed:
+                        yield missed
+                while True:
+                    try:
+                        message = client.get(timeout=HEARTBEAT_INTERVAL)
+                    except queue.Empty:
+                        yield ': heartbeat\n\n'
+                        continue
+                    if message is None:
+                        return
+                    yield message
+            finally:
+                # also runs when the browser disconnects
+                broadcaster.unsubscribe(client)
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                # nginx would buffer the stream otherwise
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+    return events
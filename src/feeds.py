@@ -0,0 +1,77 @@
+from xml.etree import ElementTree
+from datetime import datetime
+from email.utils import format_datetime
+from zoneinfo import ZoneInfo
+
+from src.store import DATE_FORMAT
+
+
+# the time zone of the stored dates; src.dates.SOFIA isn't imported, as
+# that would import pandas in the web process
+TIME_ZONE = 'Europe/Sofia'
+
+ATOM_NAMESPACE = 'http://www.w3.org/2005/Atom'
+
+
+def _local_date(date):
+    # the stored dates are in the local time of the websites
+    return datetime.strptime(date, DATE_FORMAT).replace(tzinfo=ZoneInfo(TIME_ZONE))
+
+
+def _text(parent, tag, text=None, **attributes):
+    element = ElementTree.SubElement(parent, tag, attributes)
+    element.text = text
+    return element
+
+
+def _serialize(root):
+    return ElementTree.tostring(root, encoding='utf-8', xml_declaration=True)
+
+
+def rss(updates, title, link, description):
+    '''Returns the updates (newest first) as an RSS 2.0 document.'''
+    root = ElementTree.Element('rss', version='2.0')
+    channel = _text(root, 'channel')
+    _text(channel, 'title', title)
+    _text(channel, 'link', link)
+    _text(channel, 'description', description)
+    _text(channel, 'language', 'bg')
+    if updates:
+        _text(channel, 'lastBuildDate', format_datetime(_local_date(updates[0]['date'])))
+
+    for update in updates:
+        item = _text(channel, 'item')
+        _text(item, 'title', update['title'])
+        _text(item, 'link', update['url'])
+        _text(item, 'description', update['content'])
+        _text(item, 'category', update['label'])
+        _text(item, 'pubDate', format_datetime(_local_date(update['date'])))
+        _text(item, 'guid', update['id'], isPermaLink='false')
+    return _serialize(root)
+
+
+def atom(updates, title, link, feed_id):
+    '''Returns the updates (newest first) as an Atom document.'''
+    ElementTree.register_namespace('', ATOM_NAMESPACE)
+
+    def tag(name):
+        return f'{{{ATOM_NAMESPACE}}}{name}'
+
+    root = ElementTree.Element(tag('feed'))
+    _text(root, tag('title'), title)
+    _text(root, tag('id'), feed_id)
+    _text(root, tag('link'), href=link)
+    updated = _local_date(updates[0]['date']) if updates else datetime.now(ZoneInfo(TIME_ZONE))
+    _text(root, tag('updated'), updated.isoformat(timespec='seconds'))
+
+    for update in updates:
+        entry = _text(root, tag('entry'))
+        _text(entry, tag('title'), update['title'])
+        _text(entry, tag('id'), f'urn:sha1:{update["id"]}')
+        _text(entry, tag('link'), href=update['url'])
+        _text(entry, tag('updated'), _local_date(update['date']).isoformat(timespec='seconds'))
+        _text(entry, tag('category'), term=update['label'])
+        author = _text(entry, tag('author'))
+        _text(author, tag('name'), f'{update["institution"]} {update["municipality"]}')
+        _text(entry, tag('summary'), update['content'])
+    return _serialize(root)
@@ -0,0 +1,59 @@
+from multiprocessing import util
+import threading
+
+from src.registry import load_sources, SOURCES_FILE
+
+
+# the store and the driver pool of every ScrapeJob, per process
+_job_state = {}
+_job_state_lock = threading.Lock()
+
+
+class ScrapeJob:
+    '''A picklable `scrape_updates` of the registry, for the worker process.
+
+    Only paths and the cache are pickled; the store and the warm webdrivers
+    are created in the process which runs the job, the first time it does,
+    and are kept there for the next runs. The scrapers (and selenium) are
+    imported only there too, so the web process never loads them.
+    '''
+    def __init__(self, db_path, cache=None, pool_size=None, sources_path=SOURCES_FILE):
+        self.db_path = db_path
+        self.cache = cache
+        self.pool_size = pool_size
+        self.sources_path = sources_path
+
+    def _state(self, logger):
+        from src.drivers import DriverPool, create_chrome
+        from src.scrape import MAX_DRIVERS
+        from src.store import UpdateStore
+
+        key = (self.db_path, self.sources_path)
+        with _job_state_lock:
+            if key not in _job_state:
+                pool = DriverPool(create_chrome, self.pool_size or MAX_DRIVERS, logger=logger)
+                # unlike atexit, this also runs when a worker process exits
+                util.Finalize(pool, pool.close, exitpriority=10)
+                _job_state[key] = (
+                    UpdateStore(self.db_path),
+                    pool,
+                    load_sources(self.sources_path)
+                )
+            return _job_state[key]
+
+    def __call__(self, logger, progress=None, publish=None):
+        from src.scrape import scrape_updates
+        from src.policy import SourceHealth
+        from src.update import FetchCache
+
+        store, pool, sources = self._state(logger)
+        return scrape_updates(
+            logger,
+            store,
+            progress=progress,
+            pool=pool,
+            sources=sources,
+            publish=publish,
+            fetch_cache=FetchCache(self.cache) if self.cache is not None else None,
+            health=SourceHealth(self.cache) if self.cache is not None else None
+        )
@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+import threading
+import re
+
+from src.store import DATE_FORMAT
+
+
+LOCALITY = 'locality'
+DISTRICT = 'district'
+STREET = 'street'
+# the municipality of the update, so the places can be looked up by it too
+MUNICIPALITY = 'municipality'
+
+# the abbreviations and words which introduce a mention of a place
+PREFIXES = {
+    'с.': LOCALITY,
+    'село': LOCALITY,
+    'гр.': LOCALITY,
+    'град': LOCALITY,
+    'кв.': DISTRICT,
+    'квартал': DISTRICT,
+    'ж.к.': DISTRICT,
+    'жк': DISTRICT,
+    'ул.': STREET,
+    'улица': STREET,
+    'бул.': STREET,
+    'булевард': STREET
+}
+
+# the words must end there, the abbreviations can be glued to the name
+_PREFIX_ALTERNATION = '|'.join(
+    re.escape(p).replace(r'\.', r'\.\s?') if p.endswith('.') else re.escape(p) + r'(?!\w)'
+    for p in sorted(PREFIXES, key=len, reverse=True)
+)
+MENTION = re.compile(
+    r'(?<!\w)(?P<prefix>' + _PREFIX_ALTERNATION + r')\s*'
+    # a lookahead, so the name doesn't swallow the next mention
+    r'(?=(?P<name>[^,;:()\n]{1,60}))',
+    re.IGNORECASE
+)
+QUOTES = '„“”"\'«»'
+# the words which end the name of a place, e.g. 'ул. Рила от №5 до №9'
+STOP_WORDS = {
+    'от', 'до', 'и', 'в', 'във', 'на', 'с', 'със', 'при', 'между', 'след', 'за', 'по', 'към',
+    'около', 'срещу', 'без', 'ще', 'се', 'поради', 'заради',
+    # the parts of an address, e.g. 'кв. Тева бл. 5, вх. А'
+    'бл', 'блок', 'вх', 'вход', 'ет', 'етаж', 'ап', 'апартамент'
+}
+NAME_WORDS = 4
+
+# an update counts as active for this many days after its date
+ACTIVE_DAYS = 7
+# the shortest prefix of a word which can be looked up
+MIN_PREFIX = 3
+
+
+def normalize(text):
+    '''Folds a place name to the form in which it is indexed.'''
+    text = text.casefold().replace('ѝ', 'и')
+    text = re.sub(r'[^\w\s-]', ' ', text)
+    return ' '.join(text.split())
+
+
+def _name(raw):
+    words = []
+    for word in raw.strip(QUOTES + ' ').split():
+        bare = word.strip(QUOTES + '.-')
+        # the abbreviations can be glued to the number, e.g. 'бл.12'
+        if not bare or bare.casefold().split('.')[0] in STOP_WORDS or bare.startswith('№'):
+            break
+        if words and bare.isdigit():
+            # the number of a building, not a part of the name
+            break
+        if words and word.casefold().rstrip('.') + '.' in PREFIXES:
+            # the next mention starts here
+            break
+        words.append(bare)
+        if word.endswith(tuple(QUOTES)) or len(words) == NAME_WORDS:
+            break
+    return normalize(' '.join(words))
+
+
+def extract_mentions(text):
+    '''Returns the (kind, normalised name) pairs of the places in the text.'''
+    mentions = set()
+    for mention_match in MENTION.finditer(text or ''):
+        prefix = re.sub(r'\s', '', mention_match['prefix'].casefold())
+        name = _name(mention_match['name'])
+        if name:
+            mentions.add((PREFIXES[prefix], name))
+    return mentions
+
+
+class LocalityIndex:
+    '''An inverted index of the places mentioned in the stored updates.
+
+    The mentions are extracted only once per update and stored in the
+    `mentions` table; the index itself is kept in memory, keyed by
+    (kind, word) and by (kind, word prefix), so a lookup only intersects
+    a few small sets. `refresh` adds the updates stored since the last
+    refresh.
+    '''
+    def __init__(self, store):
+        self.store = store
+        self._postings = {}
+        self._dates = {}
+        self._last_rowid = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _add(self, rowid, kind, name, date):
+        self._dates[rowid] = date
+        for word in name.split():
+            self._postings.setdefault((kind, word), set()).add(rowid)
+            for end in range(MIN_PREFIX, len(word)):
+                self._postings.setdefault((kind, word[: end] + '*'), set()).add(rowid)
+
+    def refresh(self):
+        '''Indexes the updates stored since the last refresh.'''
+        with self._lock:
+            if not self._loaded:
+                mentions, self._last_rowid = self.store.mentions()
+                for rowid, kind, name, municipality, date in mentions:
+                    self._add(rowid, kind, name, date)
+                    self._add(rowid, MUNICIPALITY, normalize(municipality), date)
+                self._loaded = True
+
+            while True:
+                updates = self.store.updates_after(self._last_rowid)
+                if not updates:
+                    return
+                new_mentions = []
+                for update in updates:
+                    mentions = extract_mentions(update['title'] + '\n' + update['content'])
+                    for kind, name in mentions:
+                        new_mentions.append((update['rowid'], kind, name))
+                        self._add(update['rowid'], kind, name, update['date'])
+                    if mentions:
+                        self._add(update['rowid'], MUNICIPALITY, normalize(update['municipality']), update['date'])
+                self._last_rowid = updates[-1]['rowid']
+                self.store.add_mentions(new_mentions, self._last_rowid)
+
+    def _lookup(self, kinds, text):
+        # every word of the text must match, the last one can be a prefix
+        result = None
+        words = normalize(text).split()
+        for i, word in enumerate(words):
+            keys = [(kind, word) for kind in kinds]
+            if i == len(words) - 1 and len(word) >= MIN_PREFIX:
+                keys += [(kind, word + '*') for kind in kinds]
+            matches = set().union(*(self._postings.get(key, ()) for key in keys))
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result or set()
+
+    def query(self, street=None, place=None, since=None, limit=50):
+        '''Returns the rowids of the updates which mention `street` in `place`.
+
+        `place` is a locality, a district or a municipality. Only the updates
+        dated after `since` (by default ACTIVE_DAYS ago) are returned, the
+        newest first.
+        '''
+        if since is None:
+            since = (datetime.now() - timedelta(days=ACTIVE_DAYS)).strftime(DATE_FORMAT)
+        with self._lock:
+            candidates = None
+            if street:
+                candidates = self._lookup([STREET], street)
+            if place and candidates != set():
+                places = self._lookup([LOCALITY, DISTRICT, MUNICIPALITY], place)
+                candidates = places if candidates is None else candidates & places
+            if not candidates:
+                return []
+            dated = sorted(
+                ((self._dates[rowid], rowid) for rowid in candidates if self._dates[rowid] >= since),
+                reverse=True
+            )
+        return [rowid for _, rowid in dated[: limit]]
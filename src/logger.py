@@ -1,35 +1,139 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime as dt
+from multiprocessing import util
 import logging
+import queue
+import json
 import os
 
 
-def create_logger(logger_name, logs_dir=None):
-    # create logger
+FORMAT = '%(asctime)s [%(filename)s:%(lineno)s] %(levelname)s: %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S (%Z)'
+
+# the attributes which the scrapers add to their records with LoggerAdapters
+CONTEXT_FIELDS = ['run_id', 'source', 'label']
+
+
+class MonthlyRotatingFileHandler(RotatingFileHandler):
+    '''Writes to a file per month and also rotates it when it grows too big.
+
+    The current month is checked for every record, so a long-running
+    process switches to the new file on the first record of a month.
+    Every process writes a file of its own (with its pid in the name):
+    the web app, its scrape workers, the CLI and the backfill share the
+    logs directory, and a rollover renames the file under its writers.
+    '''
+    def __init__(self, logs_dir, name, max_bytes=0, backup_count=0):
+        self.logs_dir = logs_dir
+        self.name_prefix = name
+        self.pid = os.getpid()
+        self.month = self._current_month()
+        super().__init__(
+            self._file_name(self.month),
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8',
+            delay=True
+        )
+
+    @staticmethod
+    def _current_month():
+        return dt.now().strftime('%Y_%m')
+
+    def _file_name(self, month):
+        return os.path.join(self.logs_dir, '{}_{}_{}.log'.format(self.name_prefix, month, self.pid))
+
+    def shouldRollover(self, record):
+        if self._current_month() != self.month:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        month = self._current_month()
+        if month == self.month:
+            super().doRollover()
+            return
+
+        # a new month starts a new file instead of renaming the old one
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.month = month
+        self.baseFilename = os.path.abspath(self._file_name(month))
+
+
+class JsonFormatter(logging.Formatter):
+    '''Formats the records as JSON lines, with the scraping context if any.'''
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': f'{record.filename}:{record.lineno}',
+            'message': record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _stop_listener(listener):
+    # the listener can't be stopped twice
+    if listener._thread is not None:
+        listener.stop()
+
+
+def create_logger(logger_name, logs_dir=None, json_format=False, level=logging.DEBUG,
+                  max_bytes=10 * 1024 * 1024, backup_count=5):
+    '''Returns the logger, setting it up on the first call in the process.
+
+    The records are only put on a queue by the logging threads; writing
+    them to the console and to the monthly log files in `logs_dir` is done
+    by a background listener. Set `json_format` to write JSON lines. The
+    files (one per process) are rotated every month and whenever they
+    reach `max_bytes`.
+    '''
     logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
+    if getattr(logger, 'queue_listener', None) is not None:
+        # already set up, don't add the handlers again
+        return logger
+
+    logger.setLevel(level)
+    # the records are handled only by the listener, not by the root logger
+    logger.propagate = False
 
     # create formatter
-    fmt = '%(asctime)s [%(filename)s:%(lineno)s] %(levelname)s: %(message)s'
-    formatter = logging.Formatter(fmt, datefmt='%Y-%m-%d %H:%M:%S (%Z)')
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(FORMAT, datefmt=DATE_FORMAT)
 
     # create console handler
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    handlers = [ch]
 
     if logs_dir:
         # create dir if it doesn't exist
         os.makedirs(logs_dir, exist_ok=True)
         # create file handler
-        current_month = dt.now().strftime('%Y_%m')
-        log_file_name = os.path.join(
-            logs_dir,
-            '{}_{}.log'.format(logger.name, current_month)
-        )
-        fh = logging.FileHandler(log_file_name)
+        fh = MonthlyRotatingFileHandler(logs_dir, logger.name, max_bytes, backup_count)
         fh.setLevel(logging.DEBUG)
         fh.setFormatter(formatter)
-        logger.addHandler(fh)
+        handlers.append(fh)
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    # unlike atexit, this also runs when a worker process exits; the
+    # lowest priority flushes the records after the other finalizers
+    util.Finalize(None, _stop_listener, args=(listener,), exitpriority=0)
 
+    logger.addHandler(QueueHandler(records))
+    logger.queue_listener = listener
     return logger
@@ -0,0 +1,236 @@
+import contextlib
+import threading
+import time
+
+
+# upper bounds (in seconds) of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PUSHED_METRICS_KEY = 'metrics'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class _Child:
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+
+    def inc(self, amount=1):
+        self.metric._inc(self.labels, amount)
+
+    def observe(self, value):
+        self.metric._observe(self.labels, value)
+
+    @contextlib.contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects the labels {self.labelnames}')
+        return _Child(self, tuple((name, labels[name]) for name in self.labelnames))
+
+    def _key(self, labels):
+        return (self.name, labels)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self._inc((), amount)
+
+    def _inc(self, labels, amount):
+        with self.registry.lock:
+            values = self.registry.values
+            values[self._key(labels)] = values.get(self._key(labels), 0) + amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value):
+        self._observe((), value)
+
+    def time(self):
+        return _Child(self, ()).time()
+
+    def _observe(self, labels, value):
+        with self.registry.lock:
+            values = self.registry.values
+            # per bucket counts (not cumulative), the sum and the count
+            state = values.setdefault(self._key(labels), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+
+def _merge(target, values):
+    for key, value in values.items():
+        if key not in target:
+            target[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            target[key] = [a + b for a, b in zip(target[key], value)]
+        else:
+            target[key] += value
+    return target
+
+
+class Registry:
+    '''Counters and histograms rendered in the Prometheus text format.
+
+    The values live in the memory of the process. Processes which don't
+    serve /metrics themselves (e.g. the scrape workers) can `push`
+    their values to a shared diskcache, which `render` adds to the local
+    values.
+    '''
+    def __init__(self):
+        self.metrics = []
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def push(self, cache):
+        '''Moves the values of this process to the cache.'''
+        with self.lock:
+            values, self.values = self.values, {}
+        with cache.transact():
+            pushed = cache.get(PUSHED_METRICS_KEY, {})
+            cache.set(PUSHED_METRICS_KEY, _merge(pushed, values))
+
+    def render(self, cache=None):
+        with self.lock:
+            values = _merge({}, self.values)
+        if cache is not None:
+            _merge(values, cache.get(PUSHED_METRICS_KEY, {}))
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            samples = sorted(
+                (labels, value)
+                for (name, labels), value in values.items()
+                if name == metric.name
+            )
+            for labels, value in samples:
+                if metric.kind == 'counter':
+                    lines.append(f'{metric.name}{_format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    bucket_labels = labels + (('le', bound),)
+                    lines.append(f'{metric.name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                bucket_labels = labels + (('le', '+Inf'),)
+                lines.append(f'{metric.name}_bucket{_format_labels(bucket_labels)} {value[-1]}')
+                lines.append(f'{metric.name}_sum{_format_labels(labels)} {value[-2]}')
+                lines.append(f'{metric.name}_count{_format_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PAGE_LOAD_SECONDS = Histogram(
+    REGISTRY,
+    'scrape_page_load_seconds',
+    'Time spent loading a listing page.',
+    ['source']
+)
+FIND_SECONDS = Histogram(
+    REGISTRY,
+    'scrape_find_seconds',
+    'Time spent finding the updates on a loaded listing page.',
+    ['source']
+)
+FIELD_SECONDS = Histogram(
+    REGISTRY,
+    'scrape_field_seconds',
+    'Time spent extracting a single field of an update.',
+    ['source', 'field']
+)
+ROWS_TOTAL = Counter(
+    REGISTRY,
+    'scrape_rows_total',
+    'Number of updates produced by a source.',
+    ['source']
+)
+UNCHANGED_PAGES_TOTAL = Counter(
+    REGISTRY,
+    'scrape_unchanged_pages_total',
+    'Number of listing pages which were not extracted because they did not change.',
+    ['source']
+)
+ERRORS_TOTAL = Counter(
+    REGISTRY,
+    'scrape_errors_total',
+    'Number of errors raised while scraping a source.',
+    ['source', 'stage', 'error']
+)
+TASK_STATUS_TOTAL = Counter(
+    REGISTRY,
+    'scrape_task_status_total',
+    'Number of scraped listings by their final status (ok, failed, timeout, skipped).',
+    ['source', 'status']
+)
+TASK_RETRIES_TOTAL = Counter(
+    REGISTRY,
+    'scrape_task_retries_total',
+    'Number of retried attempts to scrape a listing.',
+    ['source']
+)
+SCRAPE_SECONDS = Histogram(
+    REGISTRY,
+    'scrape_run_seconds',
+    'Duration of a whole scrape of all the sources.',
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+)
+BUILD_SECONDS = Histogram(
+    REGISTRY,
+    'scrape_build_seconds',
+    'Time spent storing the updates of a finished scraping task.'
+)
+RECAPTCHA_SECONDS = Histogram(
+    REGISTRY,
+    'recaptcha_verification_seconds',
+    'Duration of the reCAPTCHA verification request.',
+    ['outcome']
+)
+QUERY_SECONDS = Histogram(
+    REGISTRY,
+    'table_query_seconds',
+    'Time spent querying a page of the updates table.'
+)
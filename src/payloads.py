@@ -0,0 +1,73 @@
+import hashlib
+import gzip
+import json
+
+from src.store import UpdateStore
+from src import table
+
+
+TABLE_PAYLOAD_KEY = 'table-payload'
+TABLE_ROWS_KEY = 'table-rows'
+
+# how many pages of the default view of the table are kept ready for the callbacks
+DEFAULT_PAGES = 4
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def write_table_payload(cache, store, version):
+    '''Precomputes the default view of the table of a snapshot version.
+
+    Only the first DEFAULT_PAGES pages, newest first, are kept: as records
+    for the Dash callbacks and serialised to JSON (and gzipped) once, for
+    the API. The other pages are queried from the store when requested.
+    '''
+    records = table.table_records(store.query_frame(limit=DEFAULT_PAGES * table.PAGE_SIZE))
+    body = json.dumps(records, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with cache.transact():
+        cache.set(TABLE_PAYLOAD_KEY, {
+            'version': version,
+            'etag': _etag(body),
+            'json': body,
+            'gzip': gzip.compress(body)
+        })
+        cache.set(TABLE_ROWS_KEY, {
+            'version': version,
+            'count': store.count(),
+            'records': records
+        })
+
+
+def read_table_payload(cache):
+    '''Returns the serialised first pages of the table of the latest snapshot or None.'''
+    return cache.get(TABLE_PAYLOAD_KEY)
+
+
+def read_table_page(cache, version, page_current, page_size):
+    '''Returns (records, count) of a precomputed page of the default view.
+
+    Returns None when the page isn't precomputed for `version`.
+    '''
+    rows = cache.get(TABLE_ROWS_KEY)
+    if rows is None or rows['version'] != version:
+        return None
+    end = (page_current + 1) * page_size
+    if end > len(rows['records']) and len(rows['records']) < rows['count']:
+        return None
+    return rows['records'][page_current * page_size: end], rows['count']
+
+
+class TablePayloads:
+    '''Writes the table payload of every new snapshot version.
+
+    Picklable, so it can run in the worker processes together with the
+    scrape; the store is opened where it runs.
+    '''
+    def __init__(self, db_path, cache):
+        self.db_path = db_path
+        self.cache = cache
+
+    def __call__(self, version):
+        write_table_payload(self.cache, UpdateStore(self.db_path), version)
@@ -0,0 +1,116 @@
+import random
+import time
+
+
+SOURCE_STATUS_KEY = 'source-status'
+CIRCUIT_KEY_PREFIX = 'circuit:'
+
+# how long (in seconds) a scrape waits for the tasks after their deadline
+HARD_DEADLINE_GRACE = 10
+
+OK = 'ok'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+SKIPPED = 'skipped'
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class SourcePolicy:
+    '''How a single listing of a source is scraped.
+
+    Every attempt must finish before `deadline` seconds have passed since
+    the first one started. A failed attempt is retried up to `retries`
+    times after a jittered exponential backoff. After `failures_to_open`
+    failed runs in a row the listing is skipped for `cooldown` seconds.
+    '''
+    def __init__(self, deadline=120, retries=2, backoff=2, max_backoff=30,
+                 failures_to_open=3, cooldown=30 * 60):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures_to_open = failures_to_open
+        self.cooldown = cooldown
+
+    def run_seconds(self):
+        '''The longest a scrape of the listings with this policy can take.'''
+        return self.deadline + HARD_DEADLINE_GRACE
+
+    def backoff_seconds(self, attempt):
+        # "full jitter", so the retries of several tasks don't line up
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+DEFAULT_POLICY = SourcePolicy()
+
+
+def remaining(deadline, limit=None):
+    '''Returns the seconds left until the (monotonic) `deadline`, at most `limit`.
+
+    Raises DeadlineExceeded when nothing is left.
+    '''
+    if deadline is None:
+        return limit
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded('The source did not finish before its deadline.')
+    return left if limit is None else min(left, limit)
+
+
+def task_name(name, label):
+    return f'{name}:{label}'
+
+
+class SourceHealth:
+    '''The circuit breakers and the last status of the sources, in a diskcache.
+
+    Every listing (task) of a source has a circuit of its own, so a broken
+    listing doesn't stop the others. The state is shared by all the
+    processes which scrape or serve the sources.
+    '''
+    def __init__(self, cache, policy=DEFAULT_POLICY):
+        self.cache = cache
+        self.policy = policy
+
+    def allow(self, name, label):
+        '''Returns False while the circuit of the listing is open.'''
+        circuit = self.cache.get(CIRCUIT_KEY_PREFIX + task_name(name, label))
+        if circuit is None or circuit['opened'] is None:
+            return True
+        # after the cooldown the listing gets one more chance
+        return time.time() - circuit['opened'] >= self.policy.cooldown
+
+    def record(self, name, label, status, error=None, rows=0, seconds=0):
+        '''Stores the outcome of a listing and updates its circuit.'''
+        task = task_name(name, label)
+        with self.cache.transact():
+            if status != SKIPPED:
+                key = CIRCUIT_KEY_PREFIX + task
+                circuit = self.cache.get(key, {'failures': 0, 'opened': None})
+                if status == OK:
+                    circuit = {'failures': 0, 'opened': None}
+                else:
+                    circuit['failures'] += 1
+                    if circuit['failures'] >= self.policy.failures_to_open:
+                        circuit['opened'] = time.time()
+                self.cache.set(key, circuit)
+
+            statuses = self.cache.get(SOURCE_STATUS_KEY, {})
+            statuses[task] = {
+                'source': name,
+                'label': label,
+                'status': status,
+                'error': error,
+                'rows': rows,
+                'seconds': seconds,
+                'finished': time.time()
+            }
+            self.cache.set(SOURCE_STATUS_KEY, statuses)
+
+
+def read_source_status(cache):
+    '''Returns the last status of every scraped listing, by task name.'''
+    return cache.get(SOURCE_STATUS_KEY, {})
@@ -0,0 +1,110 @@
+import hashlib
+import time
+
+import requests
+
+from src import metrics
+
+
+SITEVERIFY_URL = 'https://www.google.com/recaptcha/api/siteverify'
+
+# a reCAPTCHA token is valid for two minutes
+TOKEN_TTL = 2 * 60
+
+VERDICT_KEY_PREFIX = 'recaptcha-verdict:'
+
+
+class VerificationError(Exception):
+    pass
+
+
+class GoogleVerifier:
+    '''Verifies the tokens with the siteverify API of Google.
+
+    The requests share one keep-alive session, so the verifications made
+    by the same process reuse the connection to Google. Both connecting and
+    reading are bounded by `timeout`, so a slow answer can't hold a worker.
+    '''
+    def __init__(self, secret, session=None, timeout=(3.05, 5)):
+        self.secret = secret
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def verify(self, token):
+        try:
+            response = self.session.post(
+                SITEVERIFY_URL,
+                data={'secret': self.secret, 'response': token},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return bool(response.json()['success'])
+        except (requests.RequestException, ValueError, KeyError) as e:
+            raise VerificationError(str(e)) from e
+
+    def close(self):
+        self.session.close()
+
+
+class LocalVerifier:
+    '''A stand-in for GoogleVerifier, e.g. for local runs without a secret.
+
+    Accepts every token in `accepted`, or every non-empty token if it is None.
+    '''
+    def __init__(self, accepted=None):
+        self.accepted = accepted
+
+    def verify(self, token):
+        if self.accepted is None:
+            return True
+        return token in self.accepted
+
+
+class RecaptchaVerifier:
+    '''Verifies reCAPTCHA tokens with a pluggable backend.
+
+    A token can be used once: after it has been checked it is kept in
+    `cache` (a diskcache shared by the server processes) as a failure for
+    its validity window, so it is neither sent to the backend again nor
+    accepted a second time.
+    '''
+    def __init__(self, backend, cache=None, ttl=TOKEN_TTL, logger=None):
+        self.backend = backend
+        self.cache = cache
+        self.ttl = ttl
+        self.logger = logger
+
+    def _key(self, token):
+        return VERDICT_KEY_PREFIX + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def verify(self, token):
+        '''Returns whether the token is valid. Errors count as a failure.'''
+        if token is None or token.strip() == '':
+            return False
+
+        key = self._key(token)
+        if self.cache is not None and key in self.cache:
+            return False
+
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            verdict = self.backend.verify(token)
+            outcome = 'success' if verdict else 'failure'
+        except VerificationError as e:
+            if self.logger:
+                self.logger.error(f'reCAPTCHA verification failed: {e}')
+            # don't cache the errors, the token may still be valid
+            return False
+        finally:
+            metrics.RECAPTCHA_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - start)
+
+        if self.cache is not None:
+            # a valid token is spent now, a replay of it must fail
+            self.cache.set(key, False, expire=self.ttl)
+        return verdict
+
+    def close(self):
+        close = getattr(self.backend, 'close', None)
+        if close:
+            close()
@@ -0,0 +1,84 @@
+# the fields of an update, in the order of the store columns
+FIELDS = ['municipality', 'institution', 'label', 'title', 'date', 'content', 'url']
+
+# columns with only a handful of distinct values, kept as categoricals
+CATEGORICAL_COLUMNS = ['municipality', 'institution', 'label']
+
+
+class Update:
+    '''A single scraped update.
+
+    The fields live in slots instead of a per-row dict. The update can
+    still be read like a dict (`update['date']`), so the code which
+    handles plain dicts works with both.
+    '''
+    __slots__ = FIELDS
+
+    def __init__(self, municipality, institution, label, title, date, content, url):
+        self.municipality = municipality
+        self.institution = institution
+        self.label = label
+        self.title = title
+        self.date = date
+        self.content = content
+        self.url = url
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def keys(self):
+        return list(FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, Update):
+            return NotImplemented
+        return all(self[f] == other[f] for f in FIELDS)
+
+    def __repr__(self):
+        return f'Update({self.institution!r}, {self.label!r}, {self.date!r}, {self.title!r})'
+
+
+class ColumnBuilder:
+    '''Collects updates straight into one list per column.'''
+    def __init__(self, columns=FIELDS):
+        self.columns = {column: [] for column in columns}
+
+    def append(self, update):
+        for column, values in self.columns.items():
+            values.append(update[column])
+
+    def extend(self, updates):
+        for update in updates:
+            self.append(update)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def to_frame(self):
+        return to_frame(self.columns)
+
+
+def to_frame(columns):
+    '''Builds a DataFrame from a dict of column lists.
+
+    The repeated values become categoricals and the text columns stay
+    plain objects, even when there are no rows.
+    '''
+    # pandas is slow to import and the web process rarely needs it
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        column: pd.Series(values, dtype='category' if column in CATEGORICAL_COLUMNS else 'object')
+        for column, values in columns.items()
+    })
+    if 'date' in frame and len(frame) and not isinstance(frame['date'].iloc[0], str):
+        frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def frame_from_rows(rows, columns):
+    '''Builds a DataFrame from database rows (tuples in `columns` order).'''
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    return to_frame(dict(zip(columns, values)))
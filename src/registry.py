@@ -0,0 +1,82 @@
+import importlib
+import json
+import zlib
+import os
+
+
+SOURCES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sources.json')
+
+# sources without a class of their own are scraped only with CSS selectors
+DEFAULT_CLASS = 'src.update:SelectorUpdates'
+
+# the keys of a definition which are set as attributes of the source class
+SOURCE_ATTRIBUTES = [
+    'name',
+    'municipality',
+    'institution',
+    'urls',
+    'engine',
+    'selectors',
+    'date_format',
+    'pagination'
+]
+
+
+class SourceDefinition:
+    '''A source declared in the registry file.
+
+    The scraper class is imported only when it is needed, so loading the
+    registry doesn't import selenium or any of the scrapers.
+    '''
+    def __init__(self, definition):
+        self.definition = definition
+        self.name = definition['name']
+        self.municipality = definition['municipality']
+        self.institution = definition['institution']
+        self.urls = definition['urls']
+        self.engine = definition.get('engine', 'selenium')
+        self.enabled = definition.get('enabled', True)
+        self._source_class = None
+
+    def source_class(self):
+        '''Returns the scraper class configured with this definition.'''
+        if self._source_class is None:
+            class_path = self.definition.get('class', DEFAULT_CLASS)
+            module_name, class_name = class_path.split(':')
+            base_class = getattr(importlib.import_module(module_name), class_name)
+            attributes = {
+                key: self.definition[key]
+                for key in SOURCE_ATTRIBUTES
+                if key in self.definition
+            }
+            attributes['engine'] = self.engine
+            attributes['__module__'] = base_class.__module__
+            self._source_class = type(base_class.__name__, (base_class,), attributes)
+        return self._source_class
+
+    def shard(self, shards):
+        # crc32 is stable across processes, unlike hash()
+        return zlib.crc32(self.name.encode('utf-8')) % shards
+
+
+def load_sources(path=SOURCES_FILE, shard=0, shards=1, names=None):
+    '''Returns the enabled sources of the registry.
+
+    With `shards` > 1 only the sources assigned to `shard` are returned, so
+    the sources can be split between several workers. `names` limits the
+    result to the sources with the given names.
+    '''
+    with open(path, encoding='utf-8') as f:
+        definitions = [SourceDefinition(d) for d in json.load(f)]
+
+    names_found = {d.name for d in definitions}
+    for name in names or []:
+        if name not in names_found:
+            raise ValueError(f'Unknown source: {name}')
+
+    return [
+        d for d in definitions
+        if d.enabled
+        and (names is None or d.name in names)
+        and d.shard(shards) == shard
+    ]
@@ -0,0 +1,155 @@
+from concurrent.futures.process import BrokenProcessPool
+import threading
+import traceback
+import time
+import os
+
+from src.workers import LocalBackend
+from src import metrics
+
+
+SNAPSHOT_KEY = 'snapshot'
+SNAPSHOT_VERSION_KEY = 'snapshot-version'
+SCRAPE_LOCK_KEY = 'scrape-lock'
+SCRAPE_PROGRESS_KEY = 'scrape-progress'
+
+
+def write_snapshot(cache, new_updates):
+    '''Records a new version of the stored updates in the cache.'''
+    with cache.transact():
+        version = cache.incr(SNAPSHOT_VERSION_KEY)
+        cache.set(SNAPSHOT_KEY, {
+            'version': version,
+            'created': time.time(),
+            'new_updates': len(new_updates)
+        })
+    return version
+
+
+def read_snapshot(cache):
+    '''Returns the latest snapshot or None if nothing has been scraped yet.'''
+    return cache.get(SNAPSHOT_KEY)
+
+
+def read_version(cache):
+    '''Returns a number which changes whenever new updates are stored.'''
+    return cache.get(SNAPSHOT_VERSION_KEY, 0)
+
+
+def read_progress(cache):
+    '''Returns the progress (in percent) of the running scrape or None.'''
+    return cache.get(SCRAPE_PROGRESS_KEY)
+
+
+def snapshot_age(snapshot):
+    '''Returns the age of the snapshot in seconds.'''
+    return time.time() - snapshot['created']
+
+
+def run_snapshot(cache, scrape, interval, logger, on_snapshot=None, timeout=None):
+    '''Runs `scrape` and records the result as a new snapshot version.
+
+    `on_snapshot` is called with every new version, e.g. to precompute what
+    is served for it. This is the job run by the workers, so it may run in
+    a worker process; all the arguments must be picklable then.
+
+    `timeout` is the longest a run can take (`interval` by default). The
+    lock of a run expires after it, so a worker which dies in the middle
+    of a run doesn't block the next ones for long.
+    '''
+    timeout = timeout or interval
+    # several server processes may share the same cache, so make sure
+    # that only one of them is scraping at a time
+    if not cache.add(SCRAPE_LOCK_KEY, os.getpid(), expire=timeout):
+        logger.info('Another process is already scraping, skipping this run.')
+        return None
+
+    def progress(percent):
+        cache.set(SCRAPE_PROGRESS_KEY, percent, expire=timeout)
+
+    def publish(new_updates):
+        # let the open pages know that the first sources are done
+        cache.incr(SNAPSHOT_VERSION_KEY)
+
+    try:
+        new_updates = scrape(logger, progress=progress, publish=publish)
+        version = write_snapshot(cache, new_updates)
+        logger.info(f'Stored snapshot version {version} with {len(new_updates)} new updates.')
+        if on_snapshot:
+            on_snapshot(version)
+        return version
+    except Exception as e:
+        logger.error(str(e) + '\n' + traceback.format_exc())
+        return None
+    finally:
+        cache.delete(SCRAPE_PROGRESS_KEY)
+        cache.delete(SCRAPE_LOCK_KEY)
+        # the worker processes don't serve /metrics themselves
+        metrics.REGISTRY.push(cache)
+
+
+class SnapshotScheduler:
+    '''Runs the scrapers in a background thread on a fixed interval.
+
+    Every successful run is recorded in the cache as a new snapshot version,
+    so the Dash callbacks only have to read the latest one. The scrapes run
+    on the `workers` backend (in a thread of this process by default), one
+    at a time: the scheduler waits for every run before the next one.
+    '''
+    def __init__(self, cache, scrape, interval, logger, workers=None, on_snapshot=None, timeout=None):
+        self.cache = cache
+        self.scrape = scrape
+        self.interval = interval
+        self.timeout = timeout
+        self.logger = logger
+        self.workers = workers or LocalBackend()
+        self.on_snapshot = on_snapshot
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='snapshot-scheduler',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.workers.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop.is_set():
+            snapshot = read_snapshot(self.cache)
+            if snapshot is None or snapshot_age(snapshot) >= self.interval:
+                self.run_once()
+                wait = self.interval
+            else:
+                # a fresh snapshot already exists (e.g. after a restart)
+                wait = self.interval - snapshot_age(snapshot)
+            self._stop.wait(wait)
+
+    def trigger(self):
+        '''Submits a scrape to the workers and returns a future of the new snapshot version.'''
+        return self.workers.submit(
+            run_snapshot,
+            self.cache,
+            self.scrape,
+            self.interval,
+            self.logger,
+            self.on_snapshot,
+            self.timeout
+        )
+
+    def run_once(self):
+        try:
+            return self.trigger().result()
+        except BrokenProcessPool as e:
+            self.logger.error(str(e) + '\n' + traceback.format_exc())
+            return None
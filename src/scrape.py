@@ -0,0 +1,254 @@
+'''Scrapes the sources without the web app:
+
+    > python -m src.scrape
+    > python -m src.scrape --sources pernik-vik pernik-toplo --json new.json
+    > python -m src.scrape --shard 0 --shards 2
+
+The new updates are appended to the same store as the ones the web app
+scrapes, so several machines can each scrape a shard of the sources.
+'''
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextlib
+import argparse
+import logging
+import json
+import time
+import uuid
+
+from src.drivers import DriverPool, create_chrome
+from src.registry import load_sources, SOURCES_FILE
+from src.scheduler import write_snapshot, SNAPSHOT_VERSION_KEY
+from src.logger import create_logger
+from src.store import UpdateStore
+from src.update import FetchCache
+from src.policy import (
+    DEFAULT_POLICY, DeadlineExceeded, SourcePolicy, SourceHealth, remaining, task_name,
+    OK, FAILED, TIMEOUT, SKIPPED
+)
+from src import engines
+from src import metrics
+
+# maximum number of Chrome instances running at the same time
+MAX_DRIVERS = 3
+
+
+def scrape_updates(logger, store, progress=None, pool=None, sources=None, publish=None,
+                   fetch_cache=None, policy=DEFAULT_POLICY, health=None):
+    '''Runs all the scrapers and returns the new updates.
+
+    Only the updates newer than the high-water marks in the `store` are
+    scraped and they are appended to the store.
+
+    Every label of every source is scraped as a separate task. Sources
+    which need a browser share the webdrivers of `pool` (a temporary pool
+    is started if none is given), the rest are downloaded through a shared
+    HTTP session. `sources` defaults to all enabled sources of the registry.
+
+    The updates of every task are stored as soon as the task finishes and
+    `publish` is called with them, so readers of the store can show them
+    before the slower sources are done. With a `fetch_cache` the listings
+    which didn't change since the last scrape aren't extracted again.
+
+    The tasks are run with the deadline and the retries of `policy`; a
+    task which fails or times out doesn't stop the others, and the run
+    returns what the rest of them found. With `health` the outcome of
+    every task is recorded and the tasks with an open circuit are skipped.
+    '''
+    def report(percent):
+        if progress:
+            progress(percent)
+
+    # the records of the run carry its id, and those of a task the source too
+    run_id = uuid.uuid4().hex[:12]
+    base_logger = logger
+    logger = logging.LoggerAdapter(base_logger, {'run_id': run_id})
+    logger.info('Starting the scraping process...')
+    start = time.perf_counter()
+    report(0)
+
+    if sources is None:
+        sources = load_sources()
+    tasks = [
+        (definition.source_class(), label)
+        for definition in sources
+        for label in definition.urls
+    ]
+    if not tasks:
+        # e.g. an empty shard or only disabled sources
+        logger.info('There are no sources to scrape.')
+        report(100)
+        return []
+
+    if pool is None:
+        pool = DriverPool(create_chrome, MAX_DRIVERS, logger=logger)
+        pool_context = pool
+    else:
+        # the warm drivers of a shared pool are kept for the next scrape
+        pool_context = contextlib.nullcontext(pool)
+
+    def scrape_task(pool, session, source, label, deadline):
+        task_logger = logging.LoggerAdapter(
+            base_logger,
+            {'run_id': run_id, 'source': source.name, 'label': label}
+        )
+        task_logger.info(f'Scraping website: {source.municipality} {source.institution} ({label})')
+        options = dict(
+            labels=[label],
+            store=store,
+            scrape=False,
+            fetch_cache=fetch_cache,
+            deadline=deadline,
+            logger=task_logger
+        )
+        if source.engine == engines.HTTP:
+            driver = engines.HttpDriver(session, timeout=remaining(deadline, engines.HTTP_TIMEOUT))
+            return list(source(driver, **options).iter_updates())
+        with pool.driver() as driver:
+            return list(source(driver, **options).iter_updates())
+
+    def run_task(pool, session, source, label):
+        '''Returns the status, the error and the updates of a task.'''
+        if health and not health.allow(source.name, label):
+            logger.info(f'Skipping {task_name(source.name, label)}, it failed too often recently.')
+            return SKIPPED, None, []
+
+        deadline = time.monotonic() + policy.deadline
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                metrics.TASK_RETRIES_TOTAL.labels(source=source.name).inc()
+            try:
+                return OK, None, scrape_task(pool, session, source, label, deadline)
+            except DeadlineExceeded as e:
+                return TIMEOUT, str(e), []
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                logger.error(f'Scraping {task_name(source.name, label)} failed (attempt {attempt + 1}): {error}')
+            delay = policy.backoff_seconds(attempt)
+            if attempt == policy.retries or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+        return FAILED, error, []
+
+    def finish(source, label, status, error, updates, started):
+        metrics.TASK_STATUS_TOTAL.labels(source=source.name, status=status).inc()
+        if health:
+            health.record(
+                source.name,
+                label,
+                status,
+                error=error,
+                rows=len(updates),
+                seconds=time.perf_counter() - started
+            )
+
+    new_updates = []
+    session = engines.create_session()
+    # the tasks check their deadline themselves, but a call which hangs
+    # (e.g. in the browser) can't be interrupted, so the run stops waiting
+    # for the tasks a little after their deadline
+    run_deadline = time.monotonic() + policy.run_seconds()
+    executor = ThreadPoolExecutor(max_workers=len(tasks))
+    with session, pool_context:
+        try:
+            task_start = time.perf_counter()
+            futures = {
+                executor.submit(run_task, pool, session, source, label): (source, label)
+                for source, label in tasks
+            }
+            pending = set(futures)
+            done = 0
+            while pending:
+                finished, pending = wait(
+                    pending,
+                    timeout=max(0, run_deadline - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
+                if not finished:
+                    break
+                for future in finished:
+                    source, label = futures[future]
+                    status, error, task_updates = future.result()
+                    with metrics.BUILD_SECONDS.time():
+                        task_updates = store.append(task_updates)
+                    finish(source, label, status, error, task_updates, task_start)
+                    new_updates += task_updates
+                    if publish and task_updates:
+                        publish(task_updates)
+                    done += 1
+                    report(int(100 * done / len(tasks)))
+
+            for future in pending:
+                source, label = futures[future]
+                logger.error(f'Gave up waiting for {task_name(source.name, label)}.')
+                finish(source, label, TIMEOUT, 'The task hung past its deadline.', [], task_start)
+        finally:
+            # the tasks which hung are left behind, their results are ignored
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    metrics.SCRAPE_SECONDS.observe(time.perf_counter() - start)
+
+    logger.info(f'Done scraping. Found {len(new_updates)} new updates.')
+    return new_updates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', nargs='*', help='the names of the sources to scrape (default: all)')
+    parser.add_argument('--shard', type=int, default=0, help='the shard of the sources to scrape')
+    parser.add_argument('--shards', type=int, default=1, help='the number of shards the sources are split into')
+    parser.add_argument('--registry', default=SOURCES_FILE, help='the registry file of the sources')
+    parser.add_argument('--db', default='./data/updates.db', help='the update store')
+    parser.add_argument('--cache', default='./cache', help='the cache shared with the web app: the fetched pages, the source health and the snapshot versions ("" to disable)')
+    parser.add_argument('--deadline', type=float, default=DEFAULT_POLICY.deadline, help='the deadline (in seconds) of every listing')
+    parser.add_argument('--retries', type=int, default=DEFAULT_POLICY.retries, help='the retries of a failed listing')
+    parser.add_argument('--json', help='also write the new updates to this file')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text')
+    args = parser.parse_args(argv)
+
+    logger = create_logger('bg_municipal_updates', 'logs', json_format=args.log_format == 'json', level='INFO')
+    sources = load_sources(args.registry, shard=args.shard, shards=args.shards, names=args.sources)
+    policy = SourcePolicy(deadline=args.deadline, retries=args.retries)
+
+    store = UpdateStore(args.db)
+    cache = fetch_cache = health = None
+    if args.cache:
+        import diskcache
+        cache = diskcache.Cache(args.cache)
+        fetch_cache = FetchCache(cache)
+        health = SourceHealth(cache, policy)
+
+    def publish(new_updates):
+        # the web app sharing the cache pushes them to the open pages
+        if cache is not None:
+            cache.incr(SNAPSHOT_VERSION_KEY)
+
+    new_updates = scrape_updates(
+        logger,
+        store,
+        sources=sources,
+        fetch_cache=fetch_cache,
+        policy=policy,
+        health=health,
+        publish=publish
+    )
+
+    if cache is not None:
+        from src.payloads import write_table_payload
+        # a new snapshot version, as after a scrape of the web app, so its
+        # ETags, feeds and table pages don't keep serving the old one
+        version = write_snapshot(cache, new_updates)
+        write_table_payload(cache, store, version)
+        logger.info(f'Stored snapshot version {version} with {len(new_updates)} new updates.')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(
+                [dict(u, date=u['date'].isoformat()) for u in new_updates],
+                f,
+                ensure_ascii=False,
+                indent=4
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+from datetime import datetime
+import contextlib
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+from src.records import frame_from_rows
+
+# how many keys of already seen updates to remember per listing
+MAX_MARK_KEYS = 500
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS updates (
+    id TEXT PRIMARY KEY,
+    municipality TEXT NOT NULL,
+    institution TEXT NOT NULL,
+    label TEXT NOT NULL,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    content TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS updates_source_date
+    ON updates (municipality, institution, date);
+
+CREATE INDEX IF NOT EXISTS updates_date
+    ON updates (date);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS updates_fts USING fts5(
+    title,
+    content,
+    content='updates',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS updates_fts_insert AFTER INSERT ON updates BEGIN
+    INSERT INTO updates_fts (rowid, title, content)
+    VALUES (new.rowid, new.title, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS updates_fts_delete AFTER DELETE ON updates BEGIN
+    INSERT INTO updates_fts (updates_fts, rowid, title, content)
+    VALUES ('delete', old.rowid, old.title, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS updates_fts_update AFTER UPDATE OF title, content ON updates BEGIN
+    INSERT INTO updates_fts (updates_fts, rowid, title, content)
+    VALUES ('delete', old.rowid, old.title, old.content);
+    INSERT INTO updates_fts (rowid, title, content)
+    VALUES (new.rowid, new.title, new.content);
+END;
+
+CREATE TABLE IF NOT EXISTS mentions (
+    update_rowid INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (update_rowid, kind, name)
+);
+
+CREATE TABLE IF NOT EXISTS extracted (
+    name TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL
+);
+
+-- the marks used to be keyed without the municipality; they are only
+-- an optimisation, so the first scrape simply rebuilds them
+DROP TABLE IF EXISTS marks;
+
+CREATE TABLE IF NOT EXISTS listing_marks (
+    municipality TEXT NOT NULL,
+    institution TEXT NOT NULL,
+    label TEXT NOT NULL,
+    date TEXT NOT NULL,
+    keys TEXT NOT NULL,
+    PRIMARY KEY (municipality, institution, label)
+);
+'''
+
+COLUMNS = [
+    'id',
+    'municipality',
+    'institution',
+    'label',
+    'title',
+    'date',
+    'content',
+    'url'
+]
+
+
+# the dates as they are shown in the table (dd.mm.yyyy HH:MM:SS), for the filters
+DATE_BG = "substr(date, 9, 2) || '.' || substr(date, 6, 2) || '.' || substr(date, 1, 4) || substr(date, 11)"
+
+# the computed columns which can be used in query filters
+FILTER_EXPRESSIONS = {
+    'date_bg': DATE_BG
+}
+
+
+def update_key(update):
+    '''Returns a stable hash which identifies a scraped update.'''
+    fields = [
+        update['municipality'],
+        update['institution'],
+        update['label'],
+        update['url'],
+        update['title'],
+        update['content']
+    ]
+    return hashlib.sha1('\n'.join(fields).encode('utf-8')).hexdigest()
+
+
+# the comparison operators which can be used in query filters
+FILTER_OPERATORS = {
+    '=': '{} = ?',
+    '!=': '{} != ?',
+    '<': '{} < ?',
+    '<=': '{} <= ?',
+    '>': '{} > ?',
+    '>=': '{} >= ?',
+    # sqlite only folds the case of ASCII characters, so use python instead
+    'contains': 'instr(casefold({}), casefold(?)) > 0',
+    'startswith': 'substr({0}, 1, length(?)) = ?'
+}
+
+
+def fts_query(search):
+    '''Turns free text into an FTS5 query matching all words as prefixes.'''
+    words = search.split()
+    return ' '.join('"{}"*'.format(w.replace('"', '""')) for w in words)
+
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+class UpdateStore:
+    '''All the updates scraped so far, stored in SQLite.
+
+    Updates are keyed by `update_key`, so storing the same update twice only
+    refreshes its `last_seen` time. The store also keeps a high-water mark
+    per (municipality, institution, label): the date of the newest update seen on that
+    listing and the keys of the latest updates, so the scrapers can stop as
+    soon as they reach known updates.
+    '''
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.create_function('casefold', 1, _casefold, deterministic=True)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        with connection:
+            yield connection
+
+    def mark(self, municipality, institution, label):
+        row = self._connection().execute(
+            'SELECT date, keys FROM listing_marks WHERE municipality = ? AND institution = ? AND label = ?',
+            (municipality, institution, label)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'date': datetime.strptime(row['date'], DATE_FORMAT),
+            'keys': json.loads(row['keys'])
+        }
+
+    def append(self, updates, move_marks=True):
+        '''Stores the updates and moves the high-water marks forward.
+
+        Returns the updates which were not stored before. Old updates (e.g.
+        from an archive) are stored with `move_marks=False`, so they don't
+        push the keys of the latest updates out of the marks.
+        '''
+        now = time.time()
+        new_updates = []
+        marks = {}
+        with self._transaction() as connection:
+            for update in updates:
+                key = update_key(update)
+                date = update['date'].strftime(DATE_FORMAT)
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO updates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        key,
+                        update['municipality'],
+                        update['institution'],
+                        update['label'],
+                        update['title'],
+                        date,
+                        update['content'],
+                        update['url'],
+                        now,
+                        now
+                    )
+                )
+                if cursor.rowcount == 0:
+                    connection.execute(
+                        'UPDATE updates SET last_seen = ? WHERE id = ?',
+                        (now, key)
+                    )
+                    continue
+                new_updates.append(update)
+                if not move_marks:
+                    continue
+
+                source = (update['municipality'], update['institution'], update['label'])
+                if source not in marks:
+                    marks[source] = self.mark(*source) or {'date': update['date'], 'keys': []}
+                mark = marks[source]
+                mark['date'] = max(mark['date'], update['date'])
+                mark['keys'] = (mark['keys'] + [key])[-MAX_MARK_KEYS:]
+
+            for (municipality, institution, label), mark in marks.items():
+                connection.execute(
+                    'INSERT OR REPLACE INTO listing_marks VALUES (?, ?, ?, ?, ?)',
+                    (
+                        municipality,
+                        institution,
+                        label,
+                        mark['date'].strftime(DATE_FORMAT),
+                        json.dumps(mark['keys'])
+                    )
+                )
+
+        return new_updates
+
+    def updates_after(self, rowid, limit=1000):
+        '''Returns the updates stored after `rowid`, in the order they were stored.'''
+        rows = self._connection().execute(
+            f'SELECT rowid, {", ".join(COLUMNS)} FROM updates '
+            'WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (rowid, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_rowid(self):
+        '''Returns the rowid of the last stored update, 0 if there are none.'''
+        row = self._connection().execute('SELECT MAX(rowid) FROM updates').fetchone()
+        return row[0] or 0
+
+    def by_rowids(self, rowids):
+        '''Returns the updates with the given rowids, in that order.'''
+        if not rowids:
+            return []
+        rows = self._connection().execute(
+            f'SELECT rowid, {", ".join(COLUMNS)} FROM updates '
+            f'WHERE rowid IN ({", ".join("?" * len(rowids))})',
+            list(rowids)
+        ).fetchall()
+        updates = {row['rowid']: {c: row[c] for c in COLUMNS} for row in rows}
+        return [updates[rowid] for rowid in rowids if rowid in updates]
+
+    def add_mentions(self, mentions, last_rowid):
+        '''Stores (update rowid, kind, name) mentions extracted up to `last_rowid`.'''
+        with self._transaction() as connection:
+            connection.executemany('INSERT OR IGNORE INTO mentions VALUES (?, ?, ?)', mentions)
+            connection.execute(
+                'INSERT OR REPLACE INTO extracted VALUES (?, ?)',
+                ('mentions', last_rowid)
+            )
+
+    def mentions(self):
+        '''Returns all the mentions with the municipality and the date of their update.
+
+        Also returns the rowid of the last update whose mentions are stored.
+        '''
+        connection = self._connection()
+        row = connection.execute("SELECT last_rowid FROM extracted WHERE name = 'mentions'").fetchone()
+        rows = connection.execute(
+            'SELECT m.update_rowid, m.kind, m.name, u.municipality, u.date '
+            'FROM mentions m JOIN updates u ON u.rowid = m.update_rowid'
+        ).fetchall()
+        return [tuple(r) for r in rows], row[0] if row else 0
+
+    def _where(self, search, filters):
+        conditions = []
+        params = []
+        if search and search.strip():
+            conditions.append(
+                'updates.rowid IN '
+                '(SELECT rowid FROM updates_fts WHERE updates_fts MATCH ?)'
+            )
+            params.append(fts_query(search))
+
+        for column, operator, value in filters or []:
+            if column not in COLUMNS and column not in FILTER_EXPRESSIONS:
+                raise ValueError(f'Unknown column: {column}')
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f'Unknown operator: {operator}')
+            condition = FILTER_OPERATORS[operator].format(FILTER_EXPRESSIONS.get(column, column))
+            # some of the conditions use the value more than once
+            params += [value] * condition.count('?')
+            conditions.append(condition)
+
+        if not conditions:
+            return '', []
+        return 'WHERE ' + ' AND '.join(conditions), params
+
+    def count(self, search=None, filters=None):
+        where, params = self._where(search, filters)
+        return self._connection().execute(
+            f'SELECT COUNT(*) FROM updates {where}',
+            params
+        ).fetchone()[0]
+
+    def _select(self, search, filters, order_by, offset, limit):
+        where, params = self._where(search, filters)
+        order_by = order_by or [('date', True)]
+        for column, _ in order_by:
+            if column not in COLUMNS:
+                raise ValueError(f'Unknown column: {column}')
+        order = ', '.join(
+            f'{column} {"DESC" if descending else "ASC"}'
+            for column, descending in order_by
+        )
+        sql = f'SELECT {", ".join(COLUMNS)} FROM updates {where} ORDER BY {order}'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [limit, offset]
+        return self._connection().execute(sql, params).fetchall()
+
+    def query(self, search=None, filters=None, order_by=None, offset=0, limit=None):
+        '''Returns a page of updates as dicts.
+
+        `filters` is a list of (column, operator, value) triples with the
+        operators from FILTER_OPERATORS and `order_by` is a list of
+        (column, descending) pairs; the columns must be taken from COLUMNS
+        (the filters can also use FILTER_EXPRESSIONS).
+        '''
+        rows = self._select(search, filters, order_by, offset, limit)
+        return [dict(row) for row in rows]
+
+    def query_after(self, filters=None, after=None, limit=100):
+        '''Returns up to `limit` updates older than `after`, newest first.
+
+        `after` is the (date, id) of the last update of the previous page, so
+        the pages don't shift when new updates are stored meanwhile.
+        '''
+        where, params = self._where(None, filters)
+        if after is not None:
+            where += (' AND ' if where else 'WHERE ') + '(date < ? OR (date = ? AND id < ?))'
+            params += [after[0], after[0], after[1]]
+        rows = self._connection().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM updates {where} ORDER BY date DESC, id DESC LIMIT ?',
+            params + [limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def query_frame(self, search=None, filters=None, order_by=None, offset=0, limit=None):
+        '''Like `query`, but returns the updates as a columnar DataFrame.'''
+        rows = self._select(search, filters, order_by, offset, limit)
+        return frame_from_rows(rows, COLUMNS)
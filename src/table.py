@@ -0,0 +1,129 @@
+import re
+
+
+# number of rows on a page of the Dash table
+PAGE_SIZE = 25
+
+# the columns of the Dash table which can be sorted and filtered, mapped to
+# the columns of the store
+STORE_COLUMNS = {
+    'date_iso': 'date',
+    'date_bg': 'date',
+    'institution': 'institution',
+    'label': 'label',
+    'title': 'title',
+    'content': 'content',
+    'link': 'url'
+}
+
+
+DATE_COLUMNS = {'date_iso', 'date_bg'}
+
+# the operators which match a part of the text, so a partial Bulgarian date
+# (e.g. '13.05' or '05.2022') is looked up in the displayed date instead
+TEXT_OPERATORS = {'contains', 'startswith'}
+
+# the operators of the Dash filtering syntax, mapped to the store operators
+FILTER_OPERATORS = {
+    '=': '=',
+    'eq': '=',
+    's=': '=',
+    '!=': '!=',
+    'ne': '!=',
+    '<': '<',
+    'lt': '<',
+    '<=': '<=',
+    'le': '<=',
+    '>': '>',
+    'gt': '>',
+    '>=': '>=',
+    'ge': '>=',
+    'contains': 'contains',
+    'icontains': 'contains',
+    'scontains': 'contains',
+    'datestartswith': 'startswith'
+}
+
+FILTER_PART = re.compile(r'^\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s+(?P<value>.*)$')
+BG_DATE = re.compile(r'^(\d{2})\.(\d{2})\.(\d{4})(.*)$')
+ISO_DATE = re.compile(r'^\d{4}(-|$)')
+
+
+def order_by(sort_by):
+    '''Translates the `sort_by` of the Dash table to store columns.'''
+    return [
+        (STORE_COLUMNS[s['column_id']], s['direction'] == 'desc')
+        for s in sort_by or []
+        if s['column_id'] in STORE_COLUMNS
+    ]
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] in '"\'`' and value[-1] == value[0]:
+        quote = value[0]
+        return value[1: -1].replace('\\' + quote, quote)
+    return value
+
+
+def _iso_date(value):
+    # dates can be typed in the Bulgarian format in any of the date columns
+    date_match = BG_DATE.match(value)
+    if date_match:
+        day, month, year, time = date_match.groups()
+        return f'{year}-{month}-{day}{time}'
+    return value
+
+
+def filters(filter_query):
+    '''Translates the `filter_query` of the Dash table to store filters.
+
+    Returns a list of (column, operator, value) triples; the parts of the
+    query which can't be translated are ignored.
+    '''
+    result = []
+    for part in (filter_query or '').split(' && '):
+        filter_match = FILTER_PART.match(part.strip())
+        if not filter_match:
+            continue
+        column = filter_match['column'].strip('"\'`')
+        operator = filter_match['operator']
+        if column not in STORE_COLUMNS or operator not in FILTER_OPERATORS:
+            continue
+
+        value = _unquote(filter_match['value'].strip())
+        store_column = STORE_COLUMNS[column]
+        operator = FILTER_OPERATORS[operator]
+        if column == 'date_bg' and operator in TEXT_OPERATORS and not ISO_DATE.match(value):
+            # the store formats its dates like the column, see store.DATE_BG
+            store_column = 'date_bg'
+        elif column in DATE_COLUMNS:
+            value = _iso_date(value)
+        result.append((store_column, operator, value))
+    return result
+
+
+def table_records(frame):
+    '''Adds the display columns of the Dash table to a frame of stored updates.
+
+    The columns are formatted for the whole frame at once and the rows are
+    only turned into dicts at the end, for the table.
+    '''
+    dates = frame['date']
+    frame = frame.assign(
+        date_iso=dates,
+        # convert the ISO date to the Bulgarian format
+        date_bg=dates.str[8: 10] + '.' + dates.str[5: 7] + '.' + dates.str[0: 4] + dates.str[10:],
+        link='[Източник](' + frame['url'] + ')'
+    )
+    return frame.to_dict(orient='records')
+
+
+def table_record(update):
+    '''The same as `table_records`, for a single update dict (without pandas).'''
+    date = update['date']
+    return dict(
+        update,
+        date_iso=date,
+        date_bg=date[8: 10] + '.' + date[5: 7] + '.' + date[0: 4] + date[10:],
+        link='[Източник](' + update['url'] + ')'
+    )
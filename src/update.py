@@ -1,53 +1,290 @@
 from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.support.ui import WebDriverWait
+from datetime import datetime
 import pandas as pd
-import time
+import contextlib
+import itertools
+import hashlib
+import logging
 import re
 
+from src.records import Update, ColumnBuilder
+from src.store import update_key
+from src.policy import remaining
+from src import engines
+from src import metrics
+from src import dates
+
+
+class FetchCache:
+    '''Validators and extracted updates of the listing pages, per source and url.
+
+    Stores the ETag/Last-Modified headers and a hash of the listing of the
+    last load of every url together with the updates extracted from it, so
+    an unchanged listing doesn't have to be extracted again. The updates
+    belong to the source which extracted them (e.g. a listing shared by
+    several municipalities is filtered per municipality), so the entries
+    are kept per source. `complete` is False when the extraction stopped
+    early, at the known updates.
+    '''
+    def __init__(self, cache, prefix='fetch:'):
+        self.cache = cache
+        self.prefix = prefix
+
+    def _key(self, source_name, url):
+        return f'{self.prefix}{source_name}:{url}'
+
+    def get(self, source_name, url):
+        return self.cache.get(self._key(source_name, url))
+
+    def set(self, source_name, url, validators, rows, complete=True):
+        self.cache.set(self._key(source_name, url), dict(validators, rows=rows, complete=complete))
+
 
 class BaseUpdates:
-    def __init__(self, driver):
+    # the definition of the source is set by the registry (see sources.json)
+    name = None
+    municipality = None
+    institution = None
+    urls = {}
+    # sources which are rendered on the server can be scraped without a browser
+    engine = engines.SELENIUM
+    # javascript which returns true once a listing page is ready to be scraped
+    ready_script = None
+    ready_timeout = 20
+    # how many known updates in a row end the scraping of a listing; more
+    # than one tolerates a pinned (older) post at the top of the listing
+    known_updates_to_stop = 2
+    # how to reach the older pages of a listing, for the backfill: either
+    # {'next': css selector of the link to the next page} or {'url': a
+    # template like '{url}&page={page}', 'start': the number of page 2}
+    pagination = None
+
+    def __init__(self, driver, labels=None, store=None, scrape=True, fetch_cache=None, deadline=None,
+                 logger=None):
         self.driver = driver
-        self.bg_month_map = {
-            'януари': '01',
-            'февруари': '02',
-            'март': '03',
-            'април': '04',
-            'май': '05',
-            'юни': '06',
-            'юли': '07',
-            'август': '08',
-            'септември': '09',
-            'октомври': '10',
-            'ноември': '11',
-            'декември': '12'
-        }
-        self._scrape_updates()
+        # scrape only a subset of the labels in self.urls if requested
+        self.labels = list(self.urls) if labels is None else labels
+        # with a store only the updates newer than the last run are scraped
+        self.store = store
+        # with a fetch cache the extraction is skipped for unchanged listings
+        self.fetch_cache = fetch_cache
+        # the time.monotonic() by which the scraping must finish, if any
+        self.deadline = deadline
+        self.logger = logger or logging.getLogger(__name__)
+        # without scraping right away the updates can be streamed with iter_updates
+        if scrape:
+            self._scrape_updates()
 
     def _scrape_updates(self):
+        builder = ColumnBuilder()
+        builder.extend(self.iter_updates())
+        self.updates = builder.to_frame()
+
+    def iter_updates(self):
+        '''Yields the new updates one by one, as soon as they are extracted.'''
+        rows = metrics.ROWS_TOTAL.labels(source=self.name)
+        for label in self.labels:
+            url = self.urls[label]
+            mark = self.store.mark(self.municipality, self.institution, label) if self.store else None
+            known_updates = 0
+            cached = self.fetch_cache.get(self.name, url) if self.fetch_cache else None
+            remaining(self.deadline)
+            with self._errors('load'), metrics.PAGE_LOAD_SECONDS.labels(source=self.name).time():
+                self.load_page(url, cached)
+
+            listing_hash = None
+            if self.engine == engines.HTTP and self.driver.not_modified:
+                unchanged = True
+            elif self.fetch_cache:
+                listing_hash = self._listing_hash()
+                unchanged = cached is not None and cached['hash'] == listing_hash
+            else:
+                unchanged = False
+
+            if unchanged:
+                metrics.UNCHANGED_PAGES_TOTAL.labels(source=self.name).inc()
+                label_updates = self._cached_updates(url, label, cached)
+            else:
+                label_updates = (
+                    self._process_update_tag(u, label, url)
+                    for u in self._timed_updates_tags(url)
+                )
+
+            extracted = []
+            stopped = False
+            for update in label_updates:
+                remaining(self.deadline)
+                extracted.append(update)
+                if mark and self._is_known(update, mark):
+                    known_updates += 1
+                    if known_updates >= self.known_updates_to_stop:
+                        # the listings are sorted by date, so the rest is known too
+                        stopped = True
+                        break
+                    continue
+                known_updates = 0
+                rows.inc()
+                # the arguments are only formatted if debug records are handled
+                self.logger.debug('Extracted %r (%s) from %s', update['title'], update['date'], url)
+                yield update
+
+            if unchanged and len(extracted) > len(cached['rows']):
+                # the page was loaded again for the rest of the listing
+                unchanged, listing_hash = False, self._listing_hash()
+            if self.fetch_cache and not unchanged:
+                self.fetch_cache.set(self.name, url, self._validators(listing_hash), extracted, complete=not stopped)
+
+    def _cached_updates(self, url, label, cached):
+        '''Yields the updates extracted from an unchanged listing before.
+
+        When that extraction stopped early at the updates known then (e.g.
+        to another store), the rest of the listing is extracted from a
+        fresh load of the page, if the cached updates run out.
+        '''
+        yield from cached['rows']
+        if cached['complete']:
+            return
+        remaining(self.deadline)
+        with self._errors('load'), metrics.PAGE_LOAD_SECONDS.labels(source=self.name).time():
+            self.load_page(url)
+        for update_tag in itertools.islice(self._timed_updates_tags(url), len(cached['rows']), None):
+            yield self._process_update_tag(update_tag, label, url)
+
+    def iter_page(self, url, label):
+        '''Loads a single listing page (e.g. of an archive) and yields all its updates.
+
+        The dates of the whole page are parsed at once with `parse_dates`.
+        '''
+        remaining(self.deadline)
+        with self._errors('load'), metrics.PAGE_LOAD_SECONDS.labels(source=self.name).time():
+            self.load_page(url)
         updates = []
-        for label, url in self.urls.items():
-            updates_tags = self._find_updates(url)
-            for u in updates_tags:
-                updates.append(self._process_update_tag(u, label, url))
-        self.updates = pd.DataFrame(updates)
-
-    def _process_update_tag(self, update_tag, label, url):
-        update_url = self._url_from_raw_html(update_tag)
+        for update_tag in self._timed_updates_tags(url):
+            remaining(self.deadline)
+            updates.append(self._process_update_tag(update_tag, label, url, parse_date=False))
+
+        with self._errors('date'), metrics.FIELD_SECONDS.labels(source=self.name, field='date').time():
+            page_dates = self.parse_dates([u.date for u in updates])
+            if page_dates.isna().any():
+                raise ValueError('No date can be found in the update tag.')
+        for update, date in zip(updates, page_dates):
+            update.date = date
+            yield update
+
+    def next_page_url(self, label, page):
+        '''Returns the url of the listing page after `page` (1 is the first one).
+
+        Returns None when the source has no pagination or, for the `next`
+        links, the loaded page has no link to a next page.
+        '''
+        if not self.pagination:
+            return None
+        if 'url' in self.pagination:
+            number = self.pagination.get('start', 2) + page - 1
+            return self.pagination['url'].format(url=self.urls[label], page=number)
+        links = self.driver.find_elements_by_css_selector(self.pagination['next'])
+        return links[0].get_attribute('href') if links else None
+
+    def _listing_fingerprint(self):
+        '''Returns the part of the loaded page which holds the updates.'''
+        return self.driver.page_source
+
+    def _listing_hash(self):
+        fingerprint = self._listing_fingerprint()
+        if isinstance(fingerprint, str):
+            fingerprint = fingerprint.encode('utf-8')
+        return hashlib.sha1(fingerprint).hexdigest()
+
+    def _validators(self, listing_hash):
+        validators = {'etag': None, 'last_modified': None, 'hash': listing_hash}
+        if self.engine == engines.HTTP:
+            validators['etag'] = self.driver.response_headers.get('ETag')
+            validators['last_modified'] = self.driver.response_headers.get('Last-Modified')
+        return validators
+
+    @contextlib.contextmanager
+    def _errors(self, stage):
+        try:
+            yield
+        except Exception as e:
+            metrics.ERRORS_TOTAL.labels(
+                source=self.name,
+                stage=stage,
+                error=type(e).__name__
+            ).inc()
+            raise
+
+    def _timed_updates_tags(self, url):
+        # the listings can be generators, so time every step of the iteration
+        find_seconds = metrics.FIND_SECONDS.labels(source=self.name)
+        with self._errors('find'), find_seconds.time():
+            updates_tags = iter(self._find_updates(url))
+        while True:
+            with self._errors('find'), find_seconds.time():
+                try:
+                    update_tag = next(updates_tags)
+                except StopIteration:
+                    return
+            yield update_tag
+
+    def _extract(self, field, method, update_tag):
+        with self._errors(field), metrics.FIELD_SECONDS.labels(source=self.name, field=field).time():
+            return method(update_tag)
+
+    def _is_known(self, update, mark):
+        return update['date'] < mark['date'] or update_key(update) in mark['keys']
+
+    def _process_update_tag(self, update_tag, label, url, parse_date=True):
+        '''Extracts an Update; without `parse_date` its date is the raw date text.'''
+        update_url = self._extract('url', self._url_from_raw_html, update_tag)
         if not update_url:
             update_url = url
 
-        return {
-            'municipality': self.municipality,
-            'institution': self.institution,
-            'label': label,
-            'title': self._title_from_raw_html(update_tag),
-            'date': self._date_from_raw_html(update_tag),
-            'content': self._content_from_raw_html(update_tag),
-            'url': update_url
-        }
+        return Update(
+            municipality=self.municipality,
+            institution=self.institution,
+            label=label,
+            title=self._extract('title', self._title_from_raw_html, update_tag),
+            date=self._extract(
+                'date',
+                self._date_from_raw_html if parse_date else self._date_text_from_raw_html,
+                update_tag
+            ),
+            content=self._extract('content', self._content_from_raw_html, update_tag),
+            url=update_url
+        )
+
+    def load_page(self, url, cached=None):
+        '''Opens the url and waits until the page satisfies `ready_script`.
+
+        For the http engine the validators of the `cached` listing are sent
+        with the request, so an unchanged page isn't downloaded again.
+        '''
+        if self.engine == engines.HTTP:
+            headers = {}
+            if cached and cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached and cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+            self.driver.get(url, headers=headers)
+            return
+
+        self.driver.get(url)
+        if self.ready_script is None:
+            return
+
+        wait = WebDriverWait(self.driver, remaining(self.deadline, self.ready_timeout), poll_frequency=0.1)
+        wait.until(
+            lambda driver: driver.execute_script(self.ready_script),
+            f'The page is not ready after {self.ready_timeout} seconds: {url}'
+        )
 
     def wait_staleness(self, element):
+        if self.engine == engines.HTTP:
+            # parsed pages never change, so there is nothing to wait for
+            return
+
         def not_staleness_of(element):
             '''The opposite of:
             https://www.selenium.dev/selenium/docs/api/py/_modules/selenium/webdriver/support/expected_conditions.html#staleness_of
@@ -62,13 +299,24 @@ class BaseUpdates:
 
             return _predicate
 
-        wait = WebDriverWait(self.driver, 20)
+        wait = WebDriverWait(self.driver, remaining(self.deadline, 20))
         wait.until(not_staleness_of(element))
 
+    def parse_date(self, text):
+        '''Returns the date in the date text of an update as a pd.Timestamp.'''
+        return dates.parse_date(text)
+
+    def parse_dates(self, texts):
+        '''Parses the date texts of many updates at once, NaT where there is no date.'''
+        return dates.parse_dates(texts)
+
     def _title_from_raw_html(self, update_tag):
         raise NotImplementedError('This method should be overridden by a child class.')
 
     def _date_from_raw_html(self, update_tag):
+        return self.parse_date(self._date_text_from_raw_html(update_tag))
+
+    def _date_text_from_raw_html(self, update_tag):
         raise NotImplementedError('This method should be overridden by a child class.')
 
     def _content_from_raw_html(self, update_tag):
@@ -79,17 +327,7 @@ class BaseUpdates:
 
 
 class PernikVikUpdates(BaseUpdates):
-    def __init__(self, driver):
-        self.municipality = 'Перник'
-        self.institution = 'ВиК'
-        self.urls = {
-            'Новини': 'http://www.vik-pernik.eu/single.php?name=%CD%EE%E2%E8%ED%E8',
-            'Ремонтни дейности': 'http://www.vik-pernik.eu/single.php?name=%D0%E5%EC%EE%ED%F2%ED%E8%20%E4%E5%E9%ED%EE%F1%F2%E8'
-        }
-        super().__init__(driver)
-
     def _find_updates(self, url):
-        self.driver.get(url)
         updates_tags = (
             self.driver
             .find_element_by_class_name('about_post')
@@ -100,14 +338,16 @@ class PernikVikUpdates(BaseUpdates):
         for u in updates_tags:
             update_tag = u.find_element_by_tag_name('td')
             try:
-                yield (
+                post = (
                     update_tag
                     .find_element_by_tag_name('div')
                     .find_element_by_tag_name('div')
                 )
-            except:
+            except Exception:
                 # the tag doesn't contain an actual update, so we skip it
                 continue
+            # yielding outside of the try lets the generator be closed early
+            yield post
 
     def _title_from_raw_html(self, update_tag):
         try:
@@ -134,41 +374,14 @@ class PernikVikUpdates(BaseUpdates):
                 # if there is no bold text, just treat the beginning of the text as the title
                 return update_tag.text[: 50]
 
-    def _date_from_raw_html(self, update_tag):
-        date_string = (
+    def _date_text_from_raw_html(self, update_tag):
+        return (
             update_tag
             .find_element_by_tag_name('div')
             # get the second div, which contains the published date
             .find_elements_by_tag_name('div')[1]
             .text
         )
-        date_match = re.search(
-            r'\d{2}.\d{2}.\d{4}, \d{2}:\d{2}:\d{2}',
-            date_string
-        )
-        
-        if date_match:
-            date_string = date_match[0]
-            # convert the date string to ISO
-            date_string = (
-                date_string[6: 10]
-                + '-'
-                + date_string[3: 5]
-                + '-'
-                + date_string[0: 2]
-                + ' '
-                + date_string[12: ]
-            )
-            return pd.Timestamp(date_string)
-        else:
-            date_match = re.search(
-                r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}',
-                date_string
-            )
-            if date_match:
-                return pd.Timestamp(date_match[0])
-            else:
-                raise ValueError('No date can be found in the update tag.')
 
     def _content_from_raw_html(self, update_tag):
         return (
@@ -183,99 +396,83 @@ class PernikVikUpdates(BaseUpdates):
 
 
 class PernikToploUpdates(BaseUpdates):
-    def __init__(self, driver):
-        self.municipality = 'Перник'
-        self.institution = 'Топлофикация'
-        self.urls = {
-            'Новини': 'https://toplo-pernik.com/news/'
+    # the listing is rendered by javascript, so wait until there is at least
+    # one post and all of the posts have their titles filled in
+    ready_script = '''
+        var listing = document.querySelector('.jet-smart-listing');
+        if (!listing) {
+            return false;
+        }
+        var posts = listing.querySelectorAll(
+            '.jet-smart-listing__featured, .jet-smart-listing__post'
+        );
+        if (posts.length == 0) {
+            return false;
         }
-        super().__init__(driver)
+        for (var i = 0; i < posts.length; i++) {
+            var title = posts[i].querySelector('.jet-smart-listing__post-title');
+            if (!title || title.innerText.trim() == '') {
+                return false;
+            }
+        }
+        return true;
+    '''
+    # extracts the fields of all posts in a single webdriver round-trip
+    extract_script = '''
+        function field(post, className, attribute) {
+            var element = post.querySelector('.' + className);
+            if (!element) {
+                return null;
+            }
+            return attribute ? element[attribute] : element.innerText;
+        }
+        var listing = document.querySelector('.jet-smart-listing');
+        var posts = Array.prototype.concat.call(
+            [],
+            Array.from(listing.querySelectorAll('.jet-smart-listing__featured')),
+            Array.from(listing.querySelectorAll('.jet-smart-listing__post'))
+        );
+        return posts.map(function (post) {
+            return {
+                'text': post.innerText,
+                'title': field(post, 'jet-smart-listing__post-title'),
+                'date': field(post, 'post__date'),
+                'content': field(post, 'jet-smart-listing__post-excerpt'),
+                'url': field(post, 'jet-smart-listing__more', 'href')
+            };
+        });
+    '''
+
+    def _listing_fingerprint(self):
+        # the rest of the page contains nonces which change on every load
+        return self.driver.execute_script(
+            "return document.querySelector('.jet-smart-listing').innerHTML;"
+        )
 
     def _find_updates(self, url):
-        self.driver.get(url)
-        self.driver.implicitly_wait(10)
-        time.sleep(10)
-
-        updates_tags = (
-            self.driver
-            .find_element_by_class_name('jet-smart-listing')
-            .find_elements_by_class_name('jet-smart-listing__featured')
-        )
-        updates_tags += (
-            self.driver
-            .find_element_by_class_name('jet-smart-listing')
-            .find_elements_by_class_name('jet-smart-listing__post')
-        )
-        return updates_tags
+        # every update tag is a plain dict with the fields of the post
+        return self.driver.execute_script(self.extract_script)
 
     def _title_from_raw_html(self, update_tag):
-        try:
-            title_tag = (
-                update_tag
-                .find_element_by_class_name('jet-smart-listing__post-title')
-            )
-            self.wait_staleness(title_tag)
-            title = title_tag.text
-            assert title, 'The title does not contain any characters.'
+        title = update_tag['title']
+        if title and title.strip():
             return title
-        except:
-            return update_tag.text[: 50]
-
-    def _date_from_raw_html(self, update_tag):
-        date_tag = (
-            update_tag
-            .find_element_by_class_name('post__date')
-        )
-        self.wait_staleness(date_tag)
-        date_string = date_tag.text
+        return update_tag['text'][: 50]
 
-        date_match = re.search(
-            r'\d{2}.\d{2}.\d{4}',
-            date_string
-        )
-
-        if date_match:
-            date_string = date_match[0]
-            # convert the date string to ISO
-            date_string = (
-                date_string[6: 10]
-                + '-'
-                + date_string[3: 5]
-                + '-'
-                + date_string[0: 2]
-            )
-            return pd.Timestamp(date_string)
-        else:
-            raise ValueError('No date can be found in the update tag.')
+    def _date_text_from_raw_html(self, update_tag):
+        return update_tag['date'] or ''
 
     def _content_from_raw_html(self, update_tag):
-        content_tag = (
-            update_tag
-            .find_element_by_class_name('jet-smart-listing__post-excerpt')
-        )
-        self.wait_staleness(content_tag)
-        return content_tag.text
+        if update_tag['content'] is None:
+            raise ValueError('No content can be found in the update tag.')
+        return update_tag['content']
 
     def _url_from_raw_html(self, update_tag):
-        url_tag = (
-            update_tag
-            .find_element_by_class_name('jet-smart-listing__more')
-        )
-        self.wait_staleness(url_tag)
-        return url_tag.get_attribute('href')
+        return update_tag['url']
 
 
 class PernikElektroUpdates(BaseUpdates):
-    def __init__(self, driver):
-        self.municipality = 'Перник'
-        self.institution = 'Електрозахранване'
-        self.urls = {
-            'Новини': 'https://electrohold.bg/bg/mediya-centr-group/novini/'
-        }
-        super().__init__(driver)
-
     def _find_updates(self, url):
-        self.driver.get(url)
         updates_tags = (
             self.driver
             .find_element_by_class_name('news-card')
@@ -283,9 +480,9 @@ class PernikElektroUpdates(BaseUpdates):
         )
         for u in updates_tags:
             self.wait_staleness(u)
-            if 'перник' in u.text.lower():
-                # return only updates that are relevant for Pernik
-                yield update_tag
+            if self.municipality.lower() in u.text.lower():
+                # return only updates that are relevant for the municipality
+                yield u
 
     def _title_from_raw_html(self, update_tag):
         try:
@@ -299,32 +496,13 @@ class PernikElektroUpdates(BaseUpdates):
         except:
             return update_tag.text[: 50]
 
-    def _date_from_raw_html(self, update_tag):
-        date_string = (
+    def _date_text_from_raw_html(self, update_tag):
+        return (
             update_tag
             .find_element_by_class_name('card-content__data')
             .text
         )
 
-        date_match = re.search(
-            r'\d{2} [а-я]{3,} \d{4}',
-            date_string
-        )
-
-        if date_match:
-            date_string = date_match[0]
-            # convert the date string to ISO
-            date_string = (
-                date_string[-4: ]
-                + '-'
-                + self.bg_month_map[date_string[3: -5]]
-                + '-'
-                + date_string[0: 2]
-            )
-            return pd.Timestamp(date_string)
-        else:
-            raise ValueError('No date can be found in the update tag.')
-
     def _content_from_raw_html(self, update_tag):
         return (
             update_tag
@@ -338,3 +516,59 @@ class PernikElektroUpdates(BaseUpdates):
             .find_element_by_class_name('card-content__button')
             .get_attribute('href')
         )
+
+
+class SelectorUpdates(BaseUpdates):
+    '''A source which is described only by the CSS selectors in its definition.
+
+    `selectors` maps 'item', 'title', 'date', 'content' and optionally 'url'
+    to CSS selectors; the fields are looked up inside of the item. The date
+    is the first match of `date_format['pattern']` in the date text, parsed
+    with `date_format['format']`; without a `date_format` all the formats
+    known to src.dates are tried.
+    '''
+    selectors = {}
+    date_format = {}
+
+    def _find_updates(self, url):
+        return self.driver.find_elements_by_css_selector(self.selectors['item'])
+
+    def _field(self, update_tag, name):
+        return update_tag.find_element_by_css_selector(self.selectors[name])
+
+    def _title_from_raw_html(self, update_tag):
+        try:
+            title = self._field(update_tag, 'title').text
+            assert title, 'The title does not contain any characters.'
+            return title
+        except Exception:
+            return update_tag.text[: 50]
+
+    def _date_text_from_raw_html(self, update_tag):
+        return self._field(update_tag, 'date').text
+
+    def parse_date(self, text):
+        if not self.date_format:
+            return dates.parse_date(text)
+
+        date_match = re.search(self.date_format['pattern'], text)
+        if date_match:
+            return pd.Timestamp(datetime.strptime(date_match[0], self.date_format['format']))
+        else:
+            raise ValueError('No date can be found in the update tag.')
+
+    def parse_dates(self, texts):
+        if not self.date_format:
+            return dates.parse_dates(texts)
+
+        # the pattern may have groups of its own, so the whole match is wrapped in one
+        matches = pd.Series(texts, dtype='object').str.extract('(' + self.date_format['pattern'] + ')')[0]
+        return pd.to_datetime(matches, format=self.date_format['format'], errors='coerce')
+
+    def _content_from_raw_html(self, update_tag):
+        return self._field(update_tag, 'content').text
+
+    def _url_from_raw_html(self, update_tag):
+        if 'url' not in self.selectors:
+            return None
+        return self._field(update_tag, 'url').get_attribute('href')
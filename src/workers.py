@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+
+
+class LocalBackend:
+    '''Runs the jobs in threads of the current process.
+
+    The jobs don't have to be picklable, which makes this backend handy for
+    local runs and for trying out jobs.
+    '''
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='worker'
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class ProcessBackend:
+    '''Runs the jobs in a pool of `processes` worker processes.
+
+    The jobs and their arguments must be picklable. The workers are started
+    with `spawn` by default, so they don't inherit the threads of the web
+    server; `initializer` is called once in every new worker (e.g. to set
+    up the logging).
+
+    A worker which dies (e.g. killed for its memory) breaks the whole pool:
+    the jobs in flight fail with BrokenProcessPool and the next submit
+    starts a new pool.
+    '''
+    def __init__(self, processes=1, initializer=None, initargs=(), start_method='spawn'):
+        self.processes = processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.start_method = start_method
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=self.initializer,
+            initargs=self.initargs
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            try:
+                return self._executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False)
+                self._executor = self._create_executor()
+                return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor = self._executor
+        executor.shutdown(wait=wait)
+
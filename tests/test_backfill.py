@@ -0,0 +1,113 @@
+from datetime import timedelta
+import diskcache
+import logging
+import pytest
+
+from bench.server import FixtureServer, NEWEST_DATE
+from src.backfill import Backfill, Checkpoints, HostLimiter
+from src.registry import load_sources, SourceDefinition
+from src.store import UpdateStore
+
+
+POSTS = 4
+
+# the links of bench/fixtures/*.pagination.html; the sources in the registry
+# declare no pagination until it is checked against their live archives
+FIXTURE_PAGINATION = {
+    'pernik-vik': {'next': '.pagination a.next'},
+    'pernik-elektro': {'next': '.pagination .next a'}
+}
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer() as server:
+        yield server
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UpdateStore(str(tmp_path / 'updates.db'))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+def archive(server, name, pages, **definition):
+    '''The source of the registry, with its listings served as archives by the fixture server.'''
+    source = load_sources(names=[name])[0]
+    urls = {label: server.url(name, i, POSTS, pages=pages) for i, label in enumerate(source.urls)}
+    definition.setdefault('pagination', FIXTURE_PAGINATION[name])
+    return SourceDefinition(dict(source.definition, urls=urls, **definition))
+
+
+def backfill(store, cache, **options):
+    return Backfill(
+        store,
+        cache,
+        logging.getLogger(__name__),
+        limiter=HostLimiter(rate=1000, burst=1000),
+        workers=2,
+        **options
+    )
+
+
+def test_follows_the_pagination_of_the_archives(server, store, cache):
+    vik = archive(server, 'pernik-vik', pages=3)
+    elektro = archive(server, 'pernik-elektro', pages=3)
+
+    stored = backfill(store, cache).run([vik, elektro])
+
+    # both listings of ViK, every page of them
+    assert store.count(filters=[('institution', '=', 'ВиК')]) == 2 * 3 * POSTS
+    oldest = store.query(filters=[('institution', '=', 'ВиК')], order_by=[('date', False)], limit=1)[0]
+    assert oldest['date'] == str(NEWEST_DATE - timedelta(hours=7 * (3 * POSTS - 1)))
+    # only the news about the municipality are kept, but all the pages are crawled
+    assert stored == store.count()
+    checkpoints = Checkpoints(cache)
+    assert checkpoints.get('pernik-elektro', 'Новини') == {'url': None, 'page': 4, 'done': True}
+    for label in vik.urls:
+        assert checkpoints.get('pernik-vik', label)['done']
+
+
+def test_resumes_from_the_checkpoints(server, store, cache):
+    vik = archive(server, 'pernik-vik', pages=3)
+    label = next(iter(vik.urls))
+
+    assert backfill(store, cache, max_pages=1).run([vik]) == 2 * POSTS
+    checkpoint = Checkpoints(cache).get('pernik-vik', label)
+    assert checkpoint['page'] == 2 and not checkpoint['done']
+    assert checkpoint['url'].endswith('page=2')
+
+    assert backfill(store, cache, max_pages=1).run([vik]) == 2 * POSTS
+    assert backfill(store, cache).run([vik]) == 2 * POSTS
+    # the archive is imported, nothing is loaded again
+    assert backfill(store, cache).run([vik]) == 0
+    assert store.count() == 2 * 3 * POSTS
+
+    # a restart crawls everything again, without storing duplicates
+    assert backfill(store, cache).run([vik], restart=True) == 0
+    assert Checkpoints(cache).get('pernik-vik', label)['done']
+
+
+def test_stops_at_the_pages_older_than_since(server, store, cache):
+    vik = archive(server, 'pernik-vik', pages=5)
+
+    backfill(store, cache, since=NEWEST_DATE - timedelta(hours=30)).run([vik])
+
+    # the third page is the first one older than `since`, and the last one crawled
+    assert store.count() == 2 * 3 * POSTS
+    for label in vik.urls:
+        assert Checkpoints(cache).get('pernik-vik', label) == {'url': None, 'page': 4, 'done': True}
+
+
+def test_stops_when_the_page_number_is_ignored(server, store, cache):
+    # the fixture server ignores the parameter, so every page is the first one
+    vik = archive(server, 'pernik-vik', pages=1, pagination={'url': '{url}&p={page}'})
+
+    assert backfill(store, cache).run([vik]) == 2 * POSTS
+    for label in vik.urls:
+        assert Checkpoints(cache).get('pernik-vik', label)['page'] == 3
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from src import dates
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Публикувано на: 13.05.2022, 10:15:00', pd.Timestamp(2022, 5, 13, 10, 15)),
+    ('13.05.2022 10:15', pd.Timestamp(2022, 5, 13, 10, 15)),
+    ('3.5.2022', pd.Timestamp(2022, 5, 3)),
+    ('2022-05-13T10:15:30', pd.Timestamp(2022, 5, 13, 10, 15, 30)),
+    ('2022-05-13', pd.Timestamp(2022, 5, 13)),
+    ('13 май 2022', pd.Timestamp(2022, 5, 13)),
+    ('13 Септември 2022, 08:30', pd.Timestamp(2022, 9, 13, 8, 30)),
+    ('13 септ. 2022 г.', pd.Timestamp(2022, 9, 13)),
+    ('1 дек 2021', pd.Timestamp(2021, 12, 1)),
+    # an impossible date is skipped in favour of the next format
+    ('31.02.2022 или 2022-03-01', pd.Timestamp(2022, 3, 1)),
+    # a date doesn't start in the middle of a number
+    ('113.05.2022 или 14.05.2022', pd.Timestamp(2022, 5, 14)),
+    ('№ 213 май 2022 от 14 май 2022', pd.Timestamp(2022, 5, 14))
+])
+def test_parse_date(text, expected):
+    assert dates.parse_date(text) == expected
+
+
+def test_parse_date_without_a_date():
+    with pytest.raises(ValueError):
+        dates.parse_date('Няма дата')
+
+
+def test_parse_date_in_sofia():
+    timestamp = dates.parse_date('13.05.2022, 10:15:00', tz=dates.SOFIA)
+    assert timestamp == pd.Timestamp('2022-05-13 10:15:00+03:00')
+    # the repeated hour at the end of the summer time is the standard time
+    assert dates.parse_date('30.10.2022, 03:30', tz=dates.SOFIA).utcoffset() == pd.Timedelta(hours=2)
+
+
+def test_parse_dates_matches_parse_date():
+    texts = [
+        'Публикувано на: 13.05.2022, 10:15:00',
+        '2022-05-13T10:15:30',
+        '13 септ. 2022 г.',
+        '13 май 2022',
+        '13 май 2022',
+        'Няма дата',
+        None,
+        '31.02.2022',
+        '113.05.2022'
+    ]
+    parsed = dates.parse_dates(texts)
+
+    assert parsed.dtype == 'datetime64[ns]'
+    assert list(parsed[: 5]) == [dates.parse_date(t) for t in texts[: 5]]
+    assert parsed[5: ].isna().all()
+
+
+def test_parse_dates_in_sofia():
+    parsed = dates.parse_dates(['13.05.2022, 10:15:00', '13.01.2022'], tz=dates.SOFIA)
+    assert list(parsed) == [
+        pd.Timestamp('2022-05-13 10:15:00+03:00'),
+        pd.Timestamp('2022-01-13 00:00:00+02:00')
+    ]
@@ -0,0 +1,94 @@
+from datetime import datetime
+import diskcache
+import logging
+import json
+import pytest
+
+flask = pytest.importorskip('flask')
+
+from src import events
+from src.events import UpdateBroadcaster, create_events
+from src.records import Update
+from src.scheduler import SNAPSHOT_VERSION_KEY
+from src.store import UpdateStore
+
+
+def make_update(title, day):
+    return Update('Перник', 'ВиК', 'Новини', title, datetime(2022, 5, day), '', f'http://example.com/{title}')
+
+
+def parse_event(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields['event'], json.loads(fields['data']), fields.get('id')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UpdateStore(str(tmp_path / 'updates.db'))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+@pytest.fixture
+def broadcaster(cache, store):
+    broadcaster = UpdateBroadcaster(cache, store, logging.getLogger(__name__), poll_interval=0.01)
+    yield broadcaster
+    broadcaster.stop()
+
+
+def test_broadcasts_the_stored_updates(broadcaster, cache, store):
+    store.append([make_update('старо', 12)])
+    client, last_rowid = broadcaster.subscribe()
+    assert last_rowid == store.last_rowid()
+
+    store.append([make_update('ново', 13)])
+    cache.incr(SNAPSHOT_VERSION_KEY)
+
+    name, rows, event_id = parse_event(client.get(timeout=5))
+    assert name == 'updates'
+    assert [row['title'] for row in rows] == ['ново']
+    assert rows[0]['date_bg'] == '13.05.2022 00:00:00'
+    assert int(event_id) == store.last_rowid()
+
+
+def test_replays_the_missed_updates(broadcaster, store):
+    store.append([make_update(str(day), day) for day in range(1, 5)])
+
+    name, rows, event_id = parse_event(broadcaster.replay(1, until=3))
+    assert name == 'updates'
+    assert [row['title'] for row in rows] == ['2', '3']
+    assert event_id == '3'
+    assert broadcaster.replay(4, until=4) is None
+
+
+def test_reloads_when_too_many_updates_were_missed(broadcaster, store, monkeypatch):
+    monkeypatch.setattr(events, 'MAX_REPLAY', 2)
+    store.append([make_update(str(day), day) for day in range(1, 5)])
+
+    name, _, event_id = parse_event(broadcaster.replay(0, until=4))
+    assert name == 'reload'
+    assert event_id == '4'
+
+
+def test_a_full_server_asks_the_browsers_to_come_back(cache, store):
+    store.append([make_update('старо', 12)])
+    broadcaster = UpdateBroadcaster(cache, store, logging.getLogger(__name__), max_clients=0)
+    app = flask.Flask(__name__)
+    app.register_blueprint(create_events(broadcaster))
+
+    with app.test_client() as client:
+        # not an error status, which would stop EventSource for good
+        response = client.get('/events')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        fields = dict(line.split(': ', 1) for line in response.get_data(as_text=True).strip().split('\n'))
+        assert fields['id'] == str(store.last_rowid())
+        assert 30000 <= int(fields['retry']) <= 90000
+
+        # a reconnecting browser keeps the updates it still has to get
+        response = client.get('/events', headers={'Last-Event-ID': '0'})
+        assert 'id: 0\n' in response.get_data(as_text=True)
@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+
+from src.locality import extract_mentions, LocalityIndex, LOCALITY, DISTRICT, STREET
+from src.records import Update
+from src.store import UpdateStore
+
+
+SINCE = '2022-05-01 00:00:00'
+
+
+def make_update(title, date, content=''):
+    return Update('Перник', 'ВиК', 'Новини', title, date, content, f'http://example.com/{title}')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UpdateStore(str(tmp_path / 'updates.db'))
+
+
+@pytest.mark.parametrize('text, mentions', [
+    ('Спиране на водата в с. Рударци без вода до 17:00', {(LOCALITY, 'рударци')}),
+    ('Авария в кв. Тева бл. 5, вх. А', {(DISTRICT, 'тева')}),
+    ('ж.к. Изток бл.12 и ул. Рила', {(DISTRICT, 'изток'), (STREET, 'рила')}),
+    ('ул. Христо Ботев вх. Б ет. 3 ап. 7', {(STREET, 'христо ботев')}),
+    ('ул. „Св. Иван Рилски“ 3', {(STREET, 'св иван рилски')}),
+    ('с. Батановци, ул. Васил Левски №1', {(LOCALITY, 'батановци'), (STREET, 'васил левски')}),
+    ('гр.Перник от 9:00 до 17:00', {(LOCALITY, 'перник')}),
+    ('Без места', set()),
+])
+def test_extract_mentions(text, mentions):
+    assert extract_mentions(text) == mentions
+
+
+def test_query_by_street_and_place(store):
+    store.append([
+        make_update('Авария на ул. Рила', datetime(2022, 5, 13), 'В кв. Тева, гр. Перник.'),
+        make_update('Ремонт на ул. Рилска', datetime(2022, 5, 12), 'В с. Рударци.'),
+        make_update('Стара авария на ул. Рила', datetime(2022, 4, 1), 'В кв. Тева.'),
+    ])
+    index = LocalityIndex(store)
+    index.refresh()
+
+    def titles(**query):
+        return [u['title'] for u in store.by_rowids(index.query(since=SINCE, **query))]
+
+    assert titles(street='Рила', place='Тева') == ['Авария на ул. Рила']
+    # the last word can be a part of a word, the newest update comes first
+    assert titles(street='рил') == ['Авария на ул. Рила', 'Ремонт на ул. Рилска']
+    # the municipality of the update counts as a place too
+    assert titles(place='Перник') == ['Авария на ул. Рила', 'Ремонт на ул. Рилска']
+    assert titles(street='Рила', place='Рударци') == []
+    assert titles(street='Витоша') == []
+
+
+def test_refresh_adds_only_the_new_updates(store):
+    store.append([make_update('Авария на ул. Рила', datetime(2022, 5, 12))])
+    index = LocalityIndex(store)
+    index.refresh()
+    store.append([make_update('Ремонт на ул. Рила', datetime(2022, 5, 13))])
+    index.refresh()
+
+    assert len(index.query(street='Рила', since=SINCE)) == 2
+    # a new index loads the stored mentions instead of extracting them again
+    mentions, last_rowid = store.mentions()
+    assert [(rowid, kind, name) for rowid, kind, name, _, _ in mentions] == [(1, 'street', 'рила'), (2, 'street', 'рила')]
+    reloaded = LocalityIndex(store)
+    reloaded.refresh()
+    assert reloaded.query(street='Рила', since=SINCE) == index.query(street='Рила', since=SINCE)
+    assert reloaded._last_rowid == last_rowid
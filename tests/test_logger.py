@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import logging
+import os
+
+from src.logger import create_logger, MonthlyRotatingFileHandler
+
+
+LOGGER_NAME = 'test_logger'
+
+
+def log_in_a_worker(logs_dir):
+    logger = create_logger(LOGGER_NAME, logs_dir)
+    logger.info('from the worker')
+    logger.queue_listener.stop()
+    return os.getpid()
+
+
+def test_every_process_writes_its_own_file(tmp_path):
+    logs_dir = str(tmp_path)
+    logger = create_logger(LOGGER_NAME, logs_dir)
+    logger.info('from the app')
+    # writes the queued records
+    logger.queue_listener.stop()
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        worker_pid = executor.submit(log_in_a_worker, logs_dir).result()
+
+    files = {}
+    for file_name in os.listdir(logs_dir):
+        with open(os.path.join(logs_dir, file_name), encoding='utf-8') as f:
+            files[file_name] = f.read()
+    assert len(files) == 2
+    pids = {int(file_name[: -len('.log')].rsplit('_', 1)[1]): text for file_name, text in files.items()}
+    assert 'from the app' in pids[os.getpid()]
+    assert 'from the worker' in pids[worker_pid]
+
+
+def test_a_rollover_keeps_the_file_of_the_process(tmp_path):
+    handler = MonthlyRotatingFileHandler(str(tmp_path), 'rotated', max_bytes=100, backup_count=1)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    try:
+        for i in range(5):
+            handler.emit(logging.makeLogRecord({'msg': f'record {i} ' + 'x' * 50}))
+    finally:
+        handler.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == [
+        os.path.basename(handler.baseFilename),
+        os.path.basename(handler.baseFilename) + '.1'
+    ]
+    assert str(os.getpid()) in os.path.basename(handler.baseFilename)
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+import diskcache
+import pytest
+import json
+
+from src.payloads import write_table_payload, read_table_payload, read_table_page, DEFAULT_PAGES
+from src.records import Update
+from src.store import UpdateStore
+from src import table
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+def test_only_the_first_pages_are_precomputed(tmp_path, cache):
+    store = UpdateStore(str(tmp_path / 'updates.db'))
+    count = DEFAULT_PAGES * table.PAGE_SIZE + 10
+    store.append([
+        Update('Перник', 'ВиК', 'Новини', f'Авария {i}', datetime(2022, 5, 13) - timedelta(hours=i), '', f'http://example.com/{i}')
+        for i in range(count)
+    ])
+    write_table_payload(cache, store, version=3)
+
+    records = json.loads(read_table_payload(cache)['json'])
+    assert len(records) == DEFAULT_PAGES * table.PAGE_SIZE
+    assert records[0]['title'] == 'Авария 0'
+
+    page, total = read_table_page(cache, 3, DEFAULT_PAGES - 1, table.PAGE_SIZE)
+    assert total == count
+    assert page[-1]['title'] == f'Авария {DEFAULT_PAGES * table.PAGE_SIZE - 1}'
+    # the pages after them and the other versions are queried from the store
+    assert read_table_page(cache, 3, DEFAULT_PAGES, table.PAGE_SIZE) is None
+    assert read_table_page(cache, 4, 0, table.PAGE_SIZE) is None
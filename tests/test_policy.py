@@ -0,0 +1,56 @@
+import diskcache
+import pytest
+import time
+
+from src.policy import SourceHealth, SourcePolicy, read_source_status, OK, FAILED, SKIPPED
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+def test_circuit_opens_after_failures(cache):
+    health = SourceHealth(cache, SourcePolicy(failures_to_open=2, cooldown=60))
+
+    health.record('pernik-vik', 'Новини', FAILED, 'timeout')
+    assert health.allow('pernik-vik', 'Новини')
+    health.record('pernik-vik', 'Новини', FAILED, 'timeout')
+    assert not health.allow('pernik-vik', 'Новини')
+    # the other listings of the source are not affected
+    assert health.allow('pernik-vik', 'Ремонтни дейности')
+
+
+def test_circuit_closes_after_success(cache):
+    health = SourceHealth(cache, SourcePolicy(failures_to_open=2, cooldown=60))
+    health.record('pernik-vik', 'Новини', FAILED)
+    health.record('pernik-vik', 'Новини', OK, rows=3)
+    health.record('pernik-vik', 'Новини', FAILED)
+    assert health.allow('pernik-vik', 'Новини')
+
+
+def test_circuit_half_opens_after_cooldown(cache):
+    health = SourceHealth(cache, SourcePolicy(failures_to_open=1, cooldown=0.1))
+    health.record('pernik-vik', 'Новини', FAILED)
+    assert not health.allow('pernik-vik', 'Новини')
+    time.sleep(0.15)
+    assert health.allow('pernik-vik', 'Новини')
+
+
+def test_skipped_runs_keep_the_circuit(cache):
+    health = SourceHealth(cache, SourcePolicy(failures_to_open=1, cooldown=60))
+    health.record('pernik-vik', 'Новини', FAILED)
+    health.record('pernik-vik', 'Новини', SKIPPED)
+    assert not health.allow('pernik-vik', 'Новини')
+
+
+def test_status_of_the_last_run(cache):
+    health = SourceHealth(cache)
+    health.record('pernik-vik', 'Новини', FAILED, 'boom', seconds=1.5)
+    health.record('pernik-vik', 'Новини', OK, rows=4, seconds=2)
+
+    status = read_source_status(cache)['pernik-vik:Новини']
+    assert status['status'] == OK
+    assert status['rows'] == 4
+    assert status['error'] is None
@@ -0,0 +1,56 @@
+import diskcache
+import pytest
+
+from src.recaptcha import RecaptchaVerifier, LocalVerifier, VerificationError
+
+
+class CountingVerifier(LocalVerifier):
+    def __init__(self, accepted=None, error=False):
+        super().__init__(accepted)
+        self.error = error
+        self.calls = 0
+
+    def verify(self, token):
+        self.calls += 1
+        if self.error:
+            raise VerificationError('Google is down.')
+        return super().verify(token)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield cache
+
+
+def test_tokens_are_used_once(cache):
+    backend = CountingVerifier(accepted={'good'})
+    recaptcha = RecaptchaVerifier(backend, cache=cache)
+
+    assert recaptcha.verify('good')
+    # a replayed token fails, also in another server process
+    assert not recaptcha.verify('good')
+    assert not RecaptchaVerifier(backend, cache=cache).verify('good')
+    assert not recaptcha.verify('bad')
+    assert not recaptcha.verify('bad')
+    assert backend.calls == 2
+
+
+def test_empty_tokens_are_not_sent(cache):
+    backend = CountingVerifier()
+    recaptcha = RecaptchaVerifier(backend, cache=cache)
+
+    assert not recaptcha.verify(None)
+    assert not recaptcha.verify('  ')
+    assert backend.calls == 0
+
+
+def test_errors_fail_without_caching(cache):
+    backend = CountingVerifier(error=True)
+    recaptcha = RecaptchaVerifier(backend, cache=cache)
+
+    assert not recaptcha.verify('token')
+    backend.error = False
+    # the token is checked again once the backend recovers
+    assert recaptcha.verify('token')
+    assert backend.calls == 2
@@ -0,0 +1,37 @@
+import diskcache
+import logging
+import json
+
+from bench.server import FixtureServer
+from src.payloads import read_table_page
+from src.registry import load_sources
+from src.scheduler import read_snapshot, read_version
+from src.scrape import scrape_updates, main
+from src.store import UpdateStore
+
+
+def test_nothing_to_scrape(tmp_path):
+    progress = []
+    store = UpdateStore(str(tmp_path / 'updates.db'))
+
+    # no pool, session or executor is started for an empty shard
+    assert scrape_updates(logging.getLogger(__name__), store, progress=progress.append, sources=[]) == []
+    assert progress == [0, 100]
+
+
+def test_cli_publishes_a_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    definition = load_sources(names=['pernik-vik'])[0].definition
+    with FixtureServer() as server:
+        urls = {label: server.url('pernik-vik', i, 4) for i, label in enumerate(definition['urls'])}
+        with open('sources.json', 'w', encoding='utf-8') as f:
+            json.dump([dict(definition, urls=urls)], f)
+        main(['--registry', 'sources.json', '--db', 'updates.db', '--cache', 'cache'])
+
+    # the web app sharing the cache sees the new updates
+    with diskcache.Cache('cache') as cache:
+        assert read_version(cache) > 0
+        assert read_snapshot(cache)['new_updates'] == 8
+        records, count = read_table_page(cache, read_version(cache), 0, 5)
+        assert count == 8
+        assert len(records) == 5
@@ -0,0 +1,89 @@
+import pandas as pd
+import os
+
+from src.registry import load_sources
+from src import engines
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def scrape_fixture(source_name, file_name, url):
+    '''Extracts the updates of a saved listing page, as the http engine would.'''
+    definition = load_sources(names=[source_name])[0]
+    label = next(iter(definition.urls))
+    driver = engines.HttpDriver(session=None)
+    with open(os.path.join(FIXTURES_DIR, file_name), 'rb') as f:
+        driver.load(f.read(), url)
+    source = definition.source_class()(driver, scrape=False)
+    return [source._process_update_tag(tag, label, url) for tag in source._find_updates(url)]
+
+
+def test_pernik_vik():
+    url = 'http://www.vik-pernik.eu/single.php?name=test'
+    updates = scrape_fixture('pernik-vik', 'pernik-vik.html', url)
+
+    # the heading row of the table holds no update
+    assert len(updates) == 2
+    first, second = updates
+    assert first['title'] == 'Авария на ул. „Рила“'
+    assert first['date'] == pd.Timestamp(2022, 5, 13, 10, 15)
+    assert first['content'] == 'Авария на ул. „Рила“\nСпиране на водата на ул. „Рила“ от №5 до №9 до 16:00 ч.'
+    # the posts have no links of their own
+    assert first['url'] == url
+    assert first['municipality'] == 'Перник'
+    assert first['institution'] == 'ВиК'
+
+    # without bold text the beginning of the post is the title
+    assert second['title'] == second['content'][: 50]
+    assert second['date'] == pd.Timestamp(2022, 5, 12, 8, 0)
+
+
+def test_pernik_elektro():
+    url = 'https://electrohold.bg/bg/mediya-centr-group/novini/'
+    updates = scrape_fixture('pernik-elektro', 'pernik-elektro.html', url)
+
+    # only the news about the municipality are kept
+    assert [u['title'] for u in updates] == [
+        'Планирани прекъсвания в Перник',
+        # the card has no title, so the beginning of its text is used
+        '10 септ. 2022\nРемонт на мрежата в Перник.\nВиж повече'[: 50]
+    ]
+    first, second = updates
+    assert first['date'] == pd.Timestamp(2022, 5, 13)
+    assert first['content'] == 'Без ток ще останат абонати в кв. Изток, град Перник.'
+    # the relative links are resolved against the listing
+    assert first['url'] == 'https://electrohold.bg/bg/novini/planirani-pernik'
+    assert second['date'] == pd.Timestamp(2022, 9, 10)
+    assert second['url'] == 'https://electrohold.bg/bg/novini/remont'
+
+
+def test_iter_page_parses_the_dates_of_the_page_at_once():
+    from bench.server import FixtureServer, NEWEST_DATE
+    from datetime import timedelta
+
+    definition = load_sources(names=['pernik-vik'])[0]
+    label = next(iter(definition.urls))
+    with FixtureServer() as server, engines.create_session() as session:
+        url = server.url('pernik-vik', 0, posts=5)
+        source = definition.source_class()(engines.HttpDriver(session), scrape=False)
+        updates = list(source.iter_page(url, label))
+
+    assert [u['date'] for u in updates] == [
+        pd.Timestamp(NEWEST_DATE - timedelta(hours=7 * i)) for i in range(5)
+    ]
+    assert all(isinstance(u['date'], pd.Timestamp) for u in updates)
+
+
+def test_selector_dates_with_a_format():
+    from src.update import SelectorUpdates
+
+    source_class = type('Source', (SelectorUpdates,), {
+        'date_format': {'pattern': r'(\d{2})/(\d{2})/(\d{4})', 'format': '%d/%m/%Y'}
+    })
+    source = source_class(None, labels=[], scrape=False)
+    texts = ['Дата: 13/05/2022', '01/06/2022 г.', 'без дата']
+
+    parsed = source.parse_dates(texts)
+    assert list(parsed[: 2]) == [source.parse_date(t) for t in texts[: 2]]
+    assert pd.isna(parsed[2])
@@ -0,0 +1,93 @@
+from datetime import datetime
+import pytest
+
+from src.records import Update
+from src.store import UpdateStore, update_key
+
+
+def make_update(title, date, label='Новини', institution='ВиК'):
+    return Update('Перник', institution, label, title, date, f'Съдържание на {title}', f'http://example.com/{title}')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UpdateStore(str(tmp_path / 'updates.db'))
+
+
+def test_append_returns_only_new_updates(store):
+    first = make_update('първо', datetime(2022, 5, 12))
+    second = make_update('второ', datetime(2022, 5, 13))
+
+    assert store.append([first]) == [first]
+    assert store.append([first, second]) == [second]
+    assert store.count() == 2
+
+
+def test_append_moves_the_marks(store):
+    assert store.mark('Перник', 'ВиК', 'Новини') is None
+
+    updates = [make_update('първо', datetime(2022, 5, 12)), make_update('второ', datetime(2022, 5, 13))]
+    store.append(updates)
+    mark = store.mark('Перник', 'ВиК', 'Новини')
+    assert mark['date'] == datetime(2022, 5, 13)
+    assert mark['keys'] == [update_key(u) for u in updates]
+    # the marks are per listing
+    assert store.mark('Перник', 'ВиК', 'Ремонтни дейности') is None
+
+
+def test_append_archive_keeps_the_marks(store):
+    store.append([make_update('ново', datetime(2022, 5, 13))])
+    store.append([make_update('старо', datetime(2019, 1, 1))], move_marks=False)
+
+    mark = store.mark('Перник', 'ВиК', 'Новини')
+    assert mark['date'] == datetime(2022, 5, 13)
+    assert len(mark['keys']) == 1
+    assert store.count() == 2
+
+
+def test_query_after_pages_without_gaps(store):
+    # two updates share a date, so the pages are ordered by the id too
+    store.append([
+        make_update('a', datetime(2022, 5, 13)),
+        make_update('b', datetime(2022, 5, 13)),
+        make_update('c', datetime(2022, 5, 12)),
+        make_update('d', datetime(2022, 5, 11), label='Ремонтни дейности')
+    ])
+
+    titles = []
+    after = None
+    while True:
+        page = store.query_after(after=after, limit=2)
+        titles += [u['title'] for u in page]
+        if len(page) < 2:
+            break
+        after = (page[-1]['date'], page[-1]['id'])
+        # an update stored meanwhile doesn't shift the next pages
+        store.append([make_update(f'ново {len(titles)}', datetime(2022, 6, 1))])
+
+    assert sorted(titles[: 2]) == ['a', 'b']
+    assert titles[2:] == ['c', 'd']
+
+
+def test_query_after_filters(store):
+    store.append([
+        make_update('a', datetime(2022, 5, 13)),
+        make_update('b', datetime(2022, 5, 12), label='Ремонтни дейности'),
+        make_update('c', datetime(2022, 5, 10), label='Ремонтни дейности')
+    ])
+    page = store.query_after(filters=[('label', '=', 'Ремонтни дейности'), ('date', '>=', '2022-05-11')])
+    assert [u['title'] for u in page] == ['b']
+
+
+def test_filters_on_the_displayed_date(store):
+    store.append([
+        make_update('a', datetime(2022, 5, 13, 10, 15)),
+        make_update('b', datetime(2021, 5, 13)),
+        make_update('c', datetime(2022, 6, 1))
+    ])
+    titles = lambda filters: sorted(u['title'] for u in store.query(filters=filters))
+
+    assert titles([('date_bg', 'startswith', '13.05')]) == ['a', 'b']
+    assert titles([('date_bg', 'contains', '05.2022')]) == ['a']
+    assert titles([('date_bg', 'contains', '13.05.2022 10:15')]) == ['a']
+    assert store.count(filters=[('date_bg', 'startswith', '01.06.2022')]) == 1
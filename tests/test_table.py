@@ -0,0 +1,59 @@
+import pandas as pd
+
+from src import table
+
+
+def test_filters():
+    query = (
+        '{institution} s= ВиК && {title} icontains "авария" '
+        '&& {date_iso} datestartswith 2022-05 && {unknown} = 1'
+    )
+    assert table.filters(query) == [
+        ('institution', '=', 'ВиК'),
+        ('title', 'contains', 'авария'),
+        ('date', 'startswith', '2022-05')
+    ]
+
+
+def test_filters_with_bulgarian_dates():
+    assert table.filters('{date_iso} >= 13.05.2022 && {link} contains pernik') == [
+        ('date', '>=', '2022-05-13'),
+        ('url', 'contains', 'pernik')
+    ]
+
+
+def test_filters_ignore_what_cannot_be_translated():
+    assert table.filters('') == []
+    assert table.filters(None) == []
+    assert table.filters('{title} like авария') == []
+
+
+def test_order_by():
+    sort_by = [
+        {'column_id': 'date_iso', 'direction': 'desc'},
+        {'column_id': 'title', 'direction': 'asc'},
+        {'column_id': 'unknown', 'direction': 'asc'}
+    ]
+    assert table.order_by(sort_by) == [('date', True), ('title', False)]
+
+
+def test_filters_with_partial_bulgarian_dates():
+    # a part of the displayed date is looked up in the same format
+    assert table.filters('{date_bg} datestartswith 13.05 && {date_bg} contains 05.2022') == [
+        ('date_bg', 'startswith', '13.05'),
+        ('date_bg', 'contains', '05.2022')
+    ]
+    # comparisons and ISO dates still use the stored date
+    assert table.filters('{date_bg} > 13.05.2022 && {date_bg} datestartswith 2022-05') == [
+        ('date', '>', '2022-05-13'),
+        ('date', 'startswith', '2022-05')
+    ]
+
+
+
+def test_table_record_matches_table_records():
+    update = {'title': 'Авария', 'date': '2022-05-13 10:15:00', 'url': 'http://example.com/1'}
+    record = table.table_record(update)
+    assert record['date_bg'] == '13.05.2022 10:15:00'
+    assert record['link'] == '[Източник](http://example.com/1)'
+    assert table.table_records(pd.DataFrame([update])) == [record]
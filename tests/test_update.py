@@ -0,0 +1,131 @@
+import diskcache
+import pytest
+
+from bench.server import FixtureServer
+from src.registry import SourceDefinition
+from src.store import UpdateStore
+from src.update import FetchCache
+from src import engines
+
+
+# the electrohold cards, scraped by a selector source to keep all of them
+CARD_SELECTORS = {
+    'item': '.card-wrapper',
+    'title': '.card-content__title',
+    'date': '.card-content__data',
+    'content': '.card-content__text',
+    'url': '.card-content__button'
+}
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer() as server:
+        yield server
+
+
+@pytest.fixture
+def session():
+    with engines.create_session() as session:
+        yield session
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UpdateStore(str(tmp_path / 'updates.db'))
+
+
+@pytest.fixture
+def fetch_cache(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        yield FetchCache(cache)
+
+
+def card_source(url, municipality='Перник'):
+    return SourceDefinition({
+        'name': f'cards-{municipality}',
+        'municipality': municipality,
+        'institution': 'Електрозахранване',
+        'engine': engines.HTTP,
+        'urls': {'Новини': url},
+        'selectors': CARD_SELECTORS
+    }).source_class()
+
+
+def scrape(source_class, session, store=None, **options):
+    '''Scrapes the source like scrape_updates and returns (updates, number of extracted tags).'''
+    source = source_class(engines.HttpDriver(session), store=store, scrape=False, **options)
+    extracted = []
+    process_update_tag = source._process_update_tag
+
+    def count_update_tag(*args, **kwargs):
+        extracted.append(process_update_tag(*args, **kwargs))
+        return extracted[-1]
+
+    source._process_update_tag = count_update_tag
+    updates = list(source.iter_updates())
+    if store:
+        store.append(updates)
+    return updates, len(extracted)
+
+
+def test_stops_at_the_known_updates(server, session, store):
+    # the listing before its two newest posts were published
+    scrape(card_source(server.url('pernik-elektro', 0, 8, first=2)), session, store)
+
+    updates, extracted = scrape(card_source(server.url('pernik-elektro', 0, 10)), session, store)
+    assert [u['url'] for u in updates] == [f'{server.base_url}/pernik-elektro/posts/{i}' for i in range(2)]
+    # the two new posts and the two known ones which end the scrape
+    assert extracted == 4
+
+
+def test_the_marks_of_the_municipalities_are_separate(server, session, store):
+    scrape(card_source(server.url('pernik-elektro', 0, 4)), session, store)
+
+    # the same institution and label, with only older posts
+    radomir = card_source(server.url('pernik-elektro', 0, 4, seed=1, first=4), municipality='Радомир')
+    updates, _ = scrape(radomir, session, store)
+    assert len(updates) == 4
+    assert store.mark('Радомир', 'Електрозахранване', 'Новини')['date'] < store.mark('Перник', 'Електрозахранване', 'Новини')['date']
+
+
+def test_reuses_the_updates_of_a_not_modified_listing(server, session, fetch_cache):
+    source_class = card_source(server.url('pernik-elektro', 0, 4))
+    updates, _ = scrape(source_class, session, fetch_cache=fetch_cache)
+
+    # the validators are sent and the server answers 304
+    assert scrape(source_class, session, fetch_cache=fetch_cache) == (updates, 0)
+
+
+def test_reuses_the_updates_of_a_listing_with_the_same_hash(server, session, fetch_cache):
+    source_class = card_source(server.url('pernik-elektro', 0, 4))
+    url = source_class.urls['Новини']
+    updates, _ = scrape(source_class, session, fetch_cache=fetch_cache)
+    # without an ETag the page is downloaded again, but not extracted
+    cached = fetch_cache.get(source_class.name, url)
+    fetch_cache.set(source_class.name, url, dict(cached, etag=None), cached['rows'])
+
+    assert scrape(source_class, session, fetch_cache=fetch_cache) == (updates, 0)
+
+
+def test_completes_the_updates_cached_by_an_early_stop(server, session, store, tmp_path, fetch_cache):
+    scrape(card_source(server.url('pernik-elektro', 0, 8, first=2)), session, store)
+    source_class = card_source(server.url('pernik-elektro', 0, 10))
+    url = source_class.urls['Новини']
+    scrape(source_class, session, store, fetch_cache=fetch_cache)
+    assert not fetch_cache.get(source_class.name, url)['complete']
+
+    # another store knows none of the updates, so the cached ones are not enough
+    updates, extracted = scrape(source_class, session, UpdateStore(str(tmp_path / 'other.db')), fetch_cache=fetch_cache)
+    assert len(updates) == 10
+    assert extracted == 6
+    cached = fetch_cache.get(source_class.name, url)
+    assert cached['complete'] and cached['rows'] == updates
+
+
+def test_sources_sharing_a_listing_keep_their_own_updates(server, session, fetch_cache):
+    url = server.url('pernik-elektro', 0, 4)
+    scrape(card_source(url), session, fetch_cache=fetch_cache)
+
+    updates, _ = scrape(card_source(url, municipality='Радомир'), session, fetch_cache=fetch_cache)
+    assert {u['municipality'] for u in updates} == {'Радомир'}
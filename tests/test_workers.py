@@ -0,0 +1,52 @@
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import diskcache
+import pytest
+import time
+import os
+
+from src.workers import ProcessBackend
+from src.scheduler import SnapshotScheduler, run_snapshot, read_snapshot, SCRAPE_LOCK_KEY
+
+
+def crash():
+    # like a worker killed for its memory
+    os._exit(1)
+
+
+def test_process_backend_recovers_from_a_dead_worker():
+    backend = ProcessBackend(processes=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            backend.submit(crash).result(60)
+        assert backend.submit(pow, 2, 3).result(60) == 8
+    finally:
+        backend.shutdown()
+
+
+def test_scrape_lock_expires_with_the_timeout(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        lock_expiry = []
+
+        def scrape(logger, progress=None, publish=None):
+            _, expire_time = cache.get(SCRAPE_LOCK_KEY, expire_time=True)
+            lock_expiry.append(expire_time - time.time())
+            return []
+
+        assert run_snapshot(cache, scrape, 3600, logging.getLogger(__name__), timeout=60) == 1
+        assert 50 < lock_expiry[0] <= 60
+        # the lock is released after the run
+        assert cache.get(SCRAPE_LOCK_KEY) is None
+
+
+def test_scheduler_runs_the_scrape_on_the_workers(tmp_path):
+    with diskcache.Cache(str(tmp_path / 'cache')) as cache:
+        def scrape(logger, progress=None, publish=None):
+            return ['new update']
+
+        scheduler = SnapshotScheduler(cache, scrape, 3600, logging.getLogger(__name__))
+        try:
+            assert scheduler.run_once() == 1
+        finally:
+            scheduler.stop()
+        assert read_snapshot(cache)['new_updates'] == 1